@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import convert_to_df, to_export_df  # noqa: E402
+from utils.archive import save_archive, CommentArchive  # noqa: E402
+from bench_convert import make_comments  # noqa: E402
+
+
+def main(n: int = 1_000_000):
+    comments_df = convert_to_df(make_comments(n))
+    tmp = tempfile.mkdtemp()
+    pkl_path, nca_path = os.path.join(tmp, 'comments.pkl'), os.path.join(tmp, 'comments.nca')
+
+    t = perf_counter()
+    to_export_df(comments_df).to_pickle(pkl_path)
+    pkl_write = perf_counter()-t
+    t = perf_counter()
+    pd.read_pickle(pkl_path)
+    pkl_read = perf_counter()-t
+
+    t = perf_counter()
+    save_archive(comments_df, nca_path)
+    nca_write = perf_counter()-t
+
+    t = perf_counter()
+    archive = CommentArchive(nca_path)
+    nca_open = perf_counter()-t
+
+    t = perf_counter()
+    late = archive.records['write_time'] > comments_df.write_time.median()
+    middle = archive.comment(len(archive)//2)
+    nca_access = perf_counter()-t
+
+    t = perf_counter()
+    loaded_df = archive.to_df()
+    nca_full = perf_counter()-t
+
+    pd.testing.assert_frame_equal(loaded_df, comments_df.sort_values('write_time', kind='stable'))
+    assert middle == loaded_df.comment.iloc[len(archive)//2] and late.sum() > 0
+
+    size = sum(p.stat().st_size for p in Path(nca_path).iterdir()) / 1e6
+    print(f'{n:,} comments')
+    print(f'pickle   write {pkl_write:6.2f}s  read {pkl_read:6.3f}s  '
+          f'{os.path.getsize(pkl_path)/1e6:7.1f} MB')
+    print(f'archive  write {nca_write:6.2f}s  open {nca_open:6.3f}s  '
+          f'{size:7.1f} MB')
+    print(f'archive  scan write_time + one comment {nca_access:6.3f}s')
+    print(f'archive  to_df {nca_full:6.3f}s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
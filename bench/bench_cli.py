@@ -0,0 +1,77 @@
+import sys
+import tempfile
+import subprocess
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from mock_server import MockNicoServer  # noqa: E402
+
+
+root = Path(__file__).resolve().parents[1]
+
+# 起動時間の目安 [s] (超えたら終了コード 1)
+# fetch はコメントの DataFrame と parquet の書き出しに pandas, pyarrow が
+# 欠かせないので，それらを import するだけの時間 (マシンによって 0.7-1.0s ほど)
+# に上乗せできる時間を目安にする
+# 上乗せ分は実測で 0.1-0.5s (requests, bs4, tqdm の import と mock への通信，
+# DataFrame への変換，parquet の書き出し)
+budgets = {
+    '--help': 0.1,
+    'fetch --mode once': 0.5,
+}
+floor_modules = {
+    'fetch --mode once': ['pandas', 'pyarrow.parquet'],
+}
+
+
+def run(args, repeat: int = 5):
+    times = []
+    for _ in range(repeat):
+        t = perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=root, check=True, capture_output=True
+        )
+        times.append(perf_counter()-t)
+
+    return min(times)
+
+
+def run_cli(args, repeat: int = 5):
+    return run([str(root / 'cli.py'), *args], repeat)
+
+
+def import_floor(modules: list, repeat: int = 5):
+    # 起動して modules を import するだけの時間
+    return run(['-c', f'import {", ".join(modules)}'], repeat) if modules else 0.0
+
+
+def main(repeat: int = 5):
+    server = MockNicoServer(comment_num=1000).start()
+    out = Path(tempfile.mkdtemp()) / 'comments.parquet'
+
+    try:
+        results = {
+            '--help': run_cli(['--help'], repeat),
+            'fetch --mode once': run_cli(
+                ['fetch', server.video_url, '--mode', 'once', '-q', '-o', str(out)], repeat
+            ),
+        }
+    finally:
+        server.stop()
+
+    over = False
+    for name, elapsed in results.items():
+        floor = import_floor(floor_modules.get(name, []), repeat)
+        budget = floor + budgets[name]
+        ok = elapsed <= budget
+        over |= not ok
+        print(f'{name:<20} {elapsed*1000:7.1f} ms  (budget {budget*1000:.0f} ms'
+              + (f' = import {floor*1000:.0f} ms + {budgets[name]*1000:.0f} ms' if floor else '')
+              + f')  {"ok" if ok else "OVER"}')
+
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
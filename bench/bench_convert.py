@@ -0,0 +1,151 @@
+import sys
+import random
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import basic_commands, convert_to_df, to_export_df  # noqa: E402
+
+
+# 比較用: 1 コメントずつ dict を組み立てていた以前の実装
+def convert_to_df_legacy(comments):
+    comments_dict = {}
+    for com in comments:
+        default_items = {
+            'user_id':   None,
+            'date_usec': 0,
+            'anonymity': 0,
+            'fork':      0,
+            'score':     0,
+            'mail':      '',
+            'position':  basic_commands['position'][0],
+            'size':      basic_commands['size'][0],
+            'color':     basic_commands['color'][0]
+        }
+        for k, v in default_items.items():
+            if k not in com:
+                com[k] = v
+
+        if com['mail']:
+            cmds = com['mail'].split()
+            if '184' in cmds:
+                if com['anonymity'] != 1:
+                    print('184 error.')
+                _ = cmds.pop(cmds.index('184'))
+
+            cmds_set = set(cmds)
+            check_dict = {
+                'position': cmds_set & set(basic_commands['position']),
+                'size':     cmds_set & set(basic_commands['size']),
+                'color':    cmds_set & set(basic_commands['color'])
+            }
+
+            for k, v in check_dict.items():
+                if v:
+                    com[k] = cmds.pop(cmds.index(v.pop()))
+
+            creplace_dict = {
+                'niconicowhite': 'white2',
+                'truered': 'red2',
+                'passionorange': 'orange2',
+                'madyellow': 'yellow2',
+                'elementalgreen': 'green2',
+                'marineblue': 'blue2',
+                'nobleviolet': 'purple2'
+            }
+            if com['color'] in creplace_dict:
+                com['color'] = creplace_dict[com['color']]
+
+            com['mail'] = ' '.join(cmds)
+
+        comment_id = f'{com["fork"]}-{com["no"]}'
+
+        vpos = '0' if com['vpos'] < 0 else str(com['vpos'])
+        write_time = float(f'{com["date"]}.{com["date_usec"]}')
+        video_time = float(f'{vpos[:-2]}.{vpos[-2:]}')
+
+        datas = {
+            'comment':    com['content'],
+            'user_id':    com['user_id'],
+            'write_time': write_time,
+            'video_time': video_time,
+            '184':        com['anonymity'],
+            'position':   com['position'],
+            'size':       com['size'],
+            'color':      com['color'],
+            'command':    com['mail'],
+            'score':      com['score']
+        }
+        datas = {
+            k: v if v is not None else np.nan
+            for k, v in datas.items()
+        }
+
+        comments_dict[comment_id] = datas
+
+    comments_df = pd.DataFrame.from_dict(comments_dict, orient='index')
+    if comments_dict:
+        comments_df.sort_values('write_time', inplace=True)
+        comments_df.index.name = 'comment_id'
+
+    return comments_df
+
+
+
+def make_comments(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    mails = [
+        '', '184', '184 ue', '184 shita big red', 'small niconicowhite',
+        'naka cyan2', '184 big marineblue patissier', 'ender 184'
+    ]
+    start = 1600000000
+    comments = []
+    for i in range(n):
+        com = {
+            'thread': '1234567890',
+            'no': i+1,
+            'vpos': rng.randint(-10, 300000),
+            'date': start + i*3 + rng.randint(0, 2),
+            'date_usec': rng.choice([0, 5, 123456, rng.randint(0, 999999)]),
+            'anonymity': 1,
+            'user_id': f'user{rng.randint(0, n//10+1)}',
+            'mail': rng.choice(mails),
+            'content': rng.choice(['草', 'www', '888', f'コメント{i}']),
+        }
+        if rng.random() < 0.1:
+            com['score'] = -rng.randint(1, 5000)
+        if rng.random() < 0.05:
+            com['fork'] = 1
+        comments.append(com)
+
+    return comments
+
+
+def measure(fn, comments):
+    # 以前の実装は chat の dict を書き換えるので毎回コピーを渡す
+    comments = [dict(com) for com in comments]
+    t = perf_counter()
+    df = fn(comments)
+    return perf_counter()-t, df
+
+
+def main(*sizes):
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    for n in sizes:
+        comments = make_comments(n)
+        legacy_t, legacy_df = measure(convert_to_df_legacy, comments)
+        columnar_t, columnar_df = measure(convert_to_df, comments)
+
+        # 以前の実装は 'fork-no' 文字列を index にしていたので揃えて比較
+        pd.testing.assert_frame_equal(legacy_df, to_export_df(columnar_df))
+
+        print(
+            f'{n:>9,} comments: legacy {legacy_t:7.3f}s  '
+            f'columnar {columnar_t:7.3f}s  speedup {legacy_t/columnar_t:5.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,71 @@
+import sys
+import random
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nlp_corpus import patch_kanjize  # noqa: E402
+patch_kanjize()
+from kanjize import kanji2int  # noqa: E402
+from utils.nlp import get_lexicon, join_numbers  # noqa: E402
+
+
+def join_numbers_pop(results, units):
+    # 以前の実装 (リストの先頭から pop するので語数の 2 乗に比例する)
+    results = list(results)
+    tmp = []
+    while len(results) > 1:
+        if results[1] in units:
+            if results[0].isdigit():
+                k = results.pop(0)
+            elif kanji2int(results[0]) > 0:
+                k = str(kanji2int(results.pop(0)))
+            else:
+                k = False
+
+            if k and len(results) > 1 and results[1] in [
+                '目', '分', '前', '後', '以内', '以上', '以下' '未満', '強', '弱'
+            ]:
+                tmp.append(k+results.pop(0)+results.pop(0))
+            elif k:
+                tmp.append(k+results.pop(0))
+            else:
+                tmp.append(results.pop(0))
+
+        else:
+            tmp.append(results.pop(0))
+
+    if results:
+        tmp.append(results.pop(0))
+
+    return tmp
+
+
+def make_tokens(num: int, units: list, seed: int = 0):
+    # 数字・漢数字・単位・接尾辞がほどよく混ざった語の列
+    rng = random.Random(seed)
+    words = ['草', '弾幕', '職人', '神回', 'ここ', '以下未満', '以下', '未満']
+    numbers = ['3', '100', '2021', '三', '二十', '百', '千五百']
+    suffixes = ['目', '分', '前', '後', '以内', '以上', '強', '弱']
+    pools = [words, numbers, units, suffixes]
+    return [rng.choice(rng.choices(pools, weights=[4, 2, 2, 1])[0]) for _ in range(num)]
+
+
+def main(num: int = 200000):
+    units = get_lexicon()['units']
+    tokens = make_tokens(num, sorted(units))
+
+    for n in [num // 10, num]:
+        t = perf_counter()
+        expected = join_numbers_pop(tokens[:n], units)
+        old = perf_counter()-t
+
+        t = perf_counter()
+        results = list(join_numbers(tokens[:n], units))
+        new = perf_counter()-t
+        print(f'{n:>9,} tokens  pop(0) {old:7.3f}s  streaming {new:7.3f}s  '
+              f'identical: {results == expected}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,72 @@
+import sys
+import numpy as np
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import (  # noqa: E402
+    convert_to_df, to_export_df, select_fork, CommentAccumulator
+)
+from bench_convert import make_comments  # noqa: E402
+
+
+# 比較用: 'fork-no' 文字列の index を毎回切り出していた以前の進捗確認
+def check_df_legacy(comments_df, tgt_forks):
+    got_forks = set(map(int, set(comments_df.index.str[0])))
+    tgt_forks = set(tgt_forks)
+    for fork in tgt_forks.copy():
+        if fork not in got_forks:
+            tgt_forks.remove(fork)
+
+    for fork in tgt_forks.copy():
+        fork_df = comments_df[comments_df.index.str[0] == str(fork)]
+        cids = sorted(list(map(int, fork_df.index.str[2:])))
+        if cids[-1] == len(cids):
+            tgt_forks.remove(fork)
+
+    return sorted(list(tgt_forks))
+
+
+def loop_legacy(str_df, batch_df, forks):
+    # 1 ループ分: 進捗確認 + fork ごとのバッチ切り出し
+    forks = check_df_legacy(str_df, forks)
+    return [batch_df[batch_df.index.str[0] == str(fork)] for fork in forks]
+
+
+def loop_numeric(acc, batch_df, forks):
+    forks = acc.check(forks)
+    return [select_fork(batch_df, fork) for fork in forks]
+
+
+def timeit(fn, *args, repeat=5):
+    t = perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (perf_counter()-t) / repeat
+
+
+def main(*sizes):
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    forks = [0, 1]
+    for n in sizes:
+        comments_df = convert_to_df(make_comments(n))
+        # 欠番を作って全件取得済みと判定されないようにする
+        comments_df = comments_df[np.arange(len(comments_df)) % 50 != 1]
+        batch_df = comments_df.iloc[-1000:]
+
+        str_df, str_batch_df = to_export_df(comments_df), to_export_df(batch_df)
+        acc = CommentAccumulator()
+        acc.add(comments_df)
+
+        legacy_t = timeit(loop_legacy, str_df, str_batch_df, forks)
+        numeric_t = timeit(loop_numeric, acc, batch_df, forks)
+
+        print(
+            f'{n:>9,} comments: str index {legacy_t*1000:9.2f} ms/loop  '
+            f'int keys {numeric_t*1000:7.2f} ms/loop  '
+            f'speedup {legacy_t/numeric_t:7.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
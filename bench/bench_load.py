@@ -0,0 +1,142 @@
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import NicovideoInfomation  # noqa: E402
+from utils import ratelimit  # noqa: E402
+from mock_server import MockNicoServer  # noqa: E402
+
+
+modes = ['once', 'roughly', 'exactly', 'async-roughly', 'async-exactly']
+
+
+def run(server, mode, args):
+    # 前のモードで下がった速度を持ち越さないよう RateLimiter は実行ごとに作り直す
+    # (ローカルサーバ相手なので制限は緩めておく)
+    ratelimit.set_limiter(server.url, ratelimit.RateLimiter(
+        rate=args.rate, burst=args.concurrency, max_rate=args.rate,
+        backoff_base=1.1, backoff_max=1.0
+    ))
+    ninfo = NicovideoInfomation(video_url=server.video_url)
+    server.reset_stats()
+
+    t = perf_counter()
+    if mode.startswith('async-'):
+        asyncio.run(ninfo.load_comments_async(
+            mode=mode[len('async-'):], check=False, concurrency=args.concurrency
+        ))
+    else:
+        ninfo.load_comments(mode=mode, check=False, tqdm_fn=silent_tqdm)
+    elapsed = perf_counter() - t
+
+    return {
+        'mode': mode,
+        'time': elapsed,
+        'requests': server.api_request_num,
+        'bytes': server.sent_bytes,
+        'comments': len(ninfo.comments_df),
+        'rate': len(ninfo.comments_df)/server.comment_num(),
+        'stall': ninfo.stall_time,
+    }
+
+
+def silent_tqdm(*args, **kwargs):
+    from tqdm.auto import tqdm
+    return tqdm(*args, disable=True, **kwargs)
+
+
+def run_scenario(args, throttle):
+    # 空の応答がどのリクエストに当たるかで結果が変わるので，
+    # シードを変えて同じ条件を繰り返し，落ちた回数と最低の取得率も見る
+    runs = {mode: [] for mode in args.modes}
+    failures = {mode: 0 for mode in args.modes}
+    for seed in range(args.seeds):
+        server = MockNicoServer(
+            comment_num=args.comments, leaves=args.leaves,
+            latency=args.latency, throttle_rate=throttle, seed=seed
+        ).start()
+
+        try:
+            for mode in args.modes:
+                try:
+                    runs[mode].append(run(server, mode, args))
+                except Exception as e:
+                    failures[mode] += 1
+                    print(f'{mode} (seed {seed}) failed: {e!r}')
+        finally:
+            server.stop()
+
+    print(
+        f'{server.comment_num():,} comments, {args.leaves} leaves/request, '
+        f'latency {args.latency*1000:.0f} ms, throttle {throttle:.0%}, '
+        f'{args.seeds} seeds'
+    )
+    print(
+        f'{"mode":<14}{"time [s]":>10}{"requests":>10}{"MB":>9}'
+        f'{"min rate":>10}{"mean rate":>11}{"stall [s]":>11}{"failed":>8}'
+    )
+    results = []
+    for mode in args.modes:
+        rs = runs[mode]
+        r = {
+            'mode': mode,
+            'failed': failures[mode],
+            'min_rate': min([r['rate'] for r in rs]) if rs else 0.0,
+        }
+        for key in ['time', 'requests', 'bytes', 'rate', 'stall']:
+            r[key] = sum([x[key] for x in rs])/len(rs) if rs else float('nan')
+        results.append(r)
+        print(
+            f'{r["mode"]:<14}{r["time"]:>10.2f}{r["requests"]:>10.0f}'
+            f'{r["bytes"]/1e6:>9.2f}{r["min_rate"]:>10.2%}'
+            f'{r["rate"]:>11.2%}{r["stall"]:>11.2f}{r["failed"]:>8}'
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='load_comments benchmark')
+    parser.add_argument('-n', '--comments', type=int, default=20000)
+    parser.add_argument('--leaves', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    # 制限なしと，空の応答が混ざる場合の両方で取得率を比べる
+    parser.add_argument('--throttle', type=float, nargs='+', default=[0.0, 0.2])
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--modes', nargs='+', default=modes, choices=modes)
+    args = parser.parse_args()
+
+    completeness = {}
+    for throttle in args.throttle:
+        for r in run_scenario(args, throttle):
+            completeness.setdefault(r['mode'], {})[throttle] = r
+        print()
+
+    # 制限がかかっていても並列に読み込む方が遅くなってはいけない
+    for throttle in args.throttle:
+        for mode in ['roughly', 'exactly']:
+            rs = completeness.get(mode, {})
+            async_rs = completeness.get(f'async-{mode}', {})
+            if throttle > 0 and throttle in rs and throttle in async_rs:
+                sync_time, async_time = rs[throttle]['time'], async_rs[throttle]['time']
+                assert async_time <= sync_time, (
+                    f'async-{mode} is slower than {mode} at throttle {throttle:.0%} '
+                    f'({async_time:.2f}s > {sync_time:.2f}s)'
+                )
+
+    # 落ちた回数 / 最低の取得率
+    print('=== failed runs / min acquisition rate ===')
+    print(f'{"mode":<14}' + ''.join(f'{f"throttle {t:.0%}":>18}' for t in args.throttle))
+    for mode, rs in completeness.items():
+        print(f'{mode:<14}' + ''.join(
+            f'{rs[t]["failed"]:>8} / {rs[t]["min_rate"]:>7.2%}' for t in args.throttle
+        ))
+
+
+if __name__ == '__main__':
+    main()
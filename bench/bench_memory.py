@@ -0,0 +1,33 @@
+import sys
+import pandas as pd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import convert_to_df, compact_df, memory_report  # noqa: E402
+from bench_convert import make_comments  # noqa: E402
+
+
+def main(n: int = 1_000_000):
+    comments_df = convert_to_df(make_comments(n))
+    compacted_df = compact_df(comments_df)
+
+    # 型を戻せば値は変わらない
+    restored_df = compacted_df.astype(comments_df.dtypes.to_dict())
+    pd.testing.assert_frame_equal(restored_df, comments_df)
+
+    report = pd.concat(
+        [memory_report(comments_df), memory_report(compacted_df)],
+        axis=1, keys=['default', 'compact']
+    )
+    print(f'{n:,} comments')
+    print(report.to_string(float_format='{:.1f}'.format))
+
+    # Application.comment_load では以前 comments_df と org_df の 2 つのコピーを持っていた
+    default_mb = report[('default', 'MB')]['total']
+    compact_mb = report[('compact', 'MB')]['total']
+    print(f'comment_load: before {default_mb*3:.1f} MB (ninfo + 2 copies), '
+          f'after {compact_mb:.1f} MB (shared)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
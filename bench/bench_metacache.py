@@ -0,0 +1,62 @@
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import NicovideoInfomation  # noqa: E402
+from utils import ratelimit, metacache  # noqa: E402
+from utils.parser import fetch_video_info  # noqa: E402
+from mock_server import MockNicoServer  # noqa: E402
+
+
+def select_video(url):
+    # GUI で動画を選んだときと同じ流れ (vid_click_callback -> card_view)
+    info = fetch_video_info(url)
+    ninfo = NicovideoInfomation(video_url=info['url'])
+    return info, ninfo
+
+
+def main(clicks: int = 10):
+    server = MockNicoServer(comment_num=1000, latency=0.05).start()
+    ratelimit.set_limiter(server.url, ratelimit.RateLimiter(rate=1000, max_rate=1000))
+    url = server.video_url + '?ref=bench'
+
+    try:
+        for name, ttl, cache_dir in [
+            ('no cache', 0, None),
+            ('memory', 600, None),
+            ('memory + disk', 600, tempfile.mkdtemp()),
+        ]:
+            metacache.configure(ttl=ttl, cache_dir=cache_dir)
+            server.reset_stats()
+
+            t = perf_counter()
+            for _ in range(clicks):
+                select_video(url)
+            elapsed = perf_counter()-t
+            print(f'{name:<14} {clicks} selections: {elapsed:6.3f}s  '
+                  f'{server.request_num} watch page fetches')
+
+        # プロセスを起動し直しても TTL 内ならディスクから読める
+        metacache.configure(ttl=600)
+        server.reset_stats()
+        select_video(url)
+        print(f'{"restart":<14} 1 selection: {server.request_num} watch page fetches')
+
+        # 同じ動画 ID でもホストが違えば別のものとして取得する
+        other = MockNicoServer(comment_num=10, latency=0.05).start()
+        try:
+            metacache.configure(ttl=600, cache_dir=None)
+            _, ninfo = select_video(url)
+            _, other_ninfo = select_video(other.video_url)
+            print(f'{"two hosts":<14} api {ninfo.api_url} / {other_ninfo.api_url}, '
+                  f'{other.request_num} watch page fetches on the second host')
+        finally:
+            other.stop()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,50 @@
+import sys
+import threading
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nlp_corpus import make_comments, patch_kanjize  # noqa: E402
+patch_kanjize()
+from utils import nlp  # noqa: E402
+
+
+def main(calls: int = 20, threads: int = 4, tokenizer: str = 'janome'):
+    # GUI で WordCloud を何度か作り直すときのように，少ないコメントで何度も呼ぶ
+    batches = [make_comments(200, seed=i) for i in range(calls)]
+
+    t = perf_counter()
+    preload = nlp.preload([tokenizer])
+    print(f'preload started   {(perf_counter()-t)*1000:8.1f} ms (background)')
+    preload.join()
+    print(f'preload finished  {(perf_counter()-t)*1000:8.1f} ms')
+
+    times = []
+    for batch in batches:
+        t = perf_counter()
+        nlp.analyze_comments(batch, tokenizer=tokenizer)
+        times.append(perf_counter()-t)
+    print(f'{calls} calls: first {times[0]*1000:.1f} ms, '
+          f'rest mean {sum(times[1:])/max(len(times)-1, 1)*1000:.1f} ms')
+
+    # 複数スレッドから同時に呼んでも 1 スレッドのときと同じ結果になるか
+    expected = [nlp.analyze_comments(batch, tokenizer=tokenizer) for batch in batches]
+    results = [None] * calls
+
+    def work(i):
+        results[i] = nlp.analyze_comments(batches[i], tokenizer=tokenizer)
+
+    nlp.token_cache.clear()
+    t = perf_counter()
+    workers = [
+        threading.Thread(target=lambda k=k: [work(i) for i in range(k, calls, threads)])
+        for k in range(threads)
+    ]
+    _ = [w.start() for w in workers]
+    _ = [w.join() for w in workers]
+    print(f'{threads} threads: {(perf_counter()-t)*1000:.1f} ms, '
+          f'identical: {results == expected}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]), *sys.argv[3:])
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nlp_corpus import make_comments, patch_kanjize  # noqa: E402
+patch_kanjize()
+from utils.nlp import normalize, replace_dict  # noqa: E402
+
+
+def normalize_per_char(comment):
+    # 以前の実装 (1 文字ごとに範囲を判定する)
+    result = comment.translate(replace_dict)
+
+    def judge_mojicode(i):
+        flg = any([
+            (44 <= i <= 57),
+            (65 <= i <= 90 or 97 <= i <= 122),
+            (12353 <= i <= 12438),
+            (12449 <= i <= 12534 or 65382 <= i <= 65439),
+            (19968 <= i <= 40959),
+            (i in [32, 37, 12289, 12290, 12540])
+        ])
+        return flg
+
+    return ''.join([s for s in result if judge_mojicode(ord(s))])
+
+
+def main(num: int = 1000000):
+    comments = make_comments(num)
+    chars = sum(map(len, comments))
+    print(f'{num:,} comments, {chars:,} characters')
+
+    results = {}
+    for name, fn in [('per char', normalize_per_char), ('table', normalize)]:
+        t = perf_counter()
+        results[name] = [fn(comment) for comment in comments]
+        elapsed = perf_counter()-t
+        print(f'{name:<9} {elapsed:7.3f}s  {chars/elapsed/1e6:6.2f} Mchar/s')
+
+    print(f'identical: {results["per char"] == results["table"]}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
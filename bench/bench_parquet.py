@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import convert_to_df, to_export_df  # noqa: E402
+from utils.columnar import save_parquet, load_parquet  # noqa: E402
+from bench_convert import make_comments  # noqa: E402
+
+
+def timeit(fn):
+    t = perf_counter()
+    result = fn()
+    return perf_counter()-t, result
+
+
+def main(n: int = 1_000_000):
+    comments_df = convert_to_df(make_comments(n))
+    export_df = to_export_df(comments_df)
+    tmp = tempfile.mkdtemp()
+    paths = {ext: os.path.join(tmp, f'comments.{ext}') for ext in ['csv', 'pkl', 'parquet']}
+
+    writers = {
+        'csv': lambda: export_df.to_csv(paths['csv']),
+        'pkl': lambda: export_df.to_pickle(paths['pkl']),
+        'parquet': lambda: save_parquet(comments_df, paths['parquet']),
+    }
+    readers = {
+        'csv': lambda: pd.read_csv(paths['csv'], index_col=0),
+        'pkl': lambda: pd.read_pickle(paths['pkl']),
+        'parquet': lambda: load_parquet(paths['parquet']),
+    }
+
+    print(f'{n:,} comments')
+    for ext in writers:
+        write_t, _ = timeit(writers[ext])
+        read_t, _ = timeit(readers[ext])
+        size = os.path.getsize(paths[ext]) / 1e6
+        print(f'{ext:<8} write {write_t:6.2f}s  read {read_t:6.2f}s  {size:8.1f} MB')
+
+    # 値と型が保存前と一致すること
+    loaded_df = load_parquet(paths['parquet'])
+    pd.testing.assert_frame_equal(
+        loaded_df.astype({c: object for c in loaded_df.columns if c not in
+                          ['write_time', 'video_time', '184', 'score']}),
+        comments_df.sort_values('write_time', kind='stable').astype(
+            {c: object for c in loaded_df.columns if c not in
+             ['write_time', 'video_time', '184', 'score']}),
+        check_dtype=False,
+    )
+
+    proj_t, proj_df = timeit(
+        lambda: load_parquet(paths['parquet'], ['comment', 'video_time'], index=False)
+    )
+    print(f'parquet  comment+video_time only        read {proj_t:6.2f}s')
+
+    t = comments_df.write_time.quantile(0.9)
+    pred_t, pred_df = timeit(
+        lambda: load_parquet(paths['parquet'], ['comment'], [('write_time', '>=', t)])
+    )
+    assert len(pred_df) == int((comments_df.write_time >= t).sum())
+    print(f'parquet  latest 10% by write_time       read {pred_t:6.2f}s ({len(pred_df):,} rows)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,98 @@
+import sys
+import numpy as np
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import (  # noqa: E402
+    convert_to_df, select_fork, CommentAccumulator, plan_exactly
+)
+from bench_convert import make_comments  # noqa: E402
+
+
+# 比較用: 欠番を集合で求め，取得済みの番号を先頭から走査していた以前の planner
+def plan_exactly_legacy(comments_df, forks, avg_cnum):
+    fork2com = {
+        fork: select_fork(comments_df, fork).droplevel('fork')
+        for fork in forks
+    }
+    unload_cids = {
+        fork: sorted(list(
+                set(range(1, fork2com[fork].index.max()+1)) - \
+                set(fork2com[fork].index)
+            ))
+        for fork in forks
+    }
+
+    tgt_cids = {fork: [] for fork in forks}
+    for fork in forks:
+        w = avg_cnum[fork]
+        max_cid = fork2com[fork].index.max()
+        l_cid = unload_cids[fork][0]
+        r_cid = min(l_cid + w, max_cid)
+
+        if r_cid != max_cid:
+            tgt_cids[fork].append(r_cid)
+
+        for i in range(1, len(unload_cids[fork])):
+            cid = unload_cids[fork][i]
+            if r_cid < cid:
+                l_cid = cid
+                r_cid = min(l_cid + w, max_cid)
+
+                if r_cid != max_cid:
+                    tgt_cids[fork].append(r_cid)
+
+    tgt_whens = {fork: [] for fork in forks}
+    for fork in forks:
+        cids = tgt_cids[fork]
+        com_cids = sorted(fork2com[fork].index)
+        tmp = []
+        for cid in cids:
+            for ccid in com_cids:
+                if ccid >= cid:
+                    tmp.append(ccid)
+                    break
+
+        tgt_whens[fork] = fork2com[fork].loc[tmp, :].write_time.values
+
+    return tgt_whens
+
+
+def main(*sizes, legacy_max: int = 100_000):
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    w = 100
+    for n in sizes:
+        comments_df = convert_to_df(make_comments(n))
+        # 数百件単位のまとまった欠番と，ばらばらの削除済みコメントを作る
+        rng = np.random.default_rng(0)
+        nos = comments_df.index.get_level_values('no').to_numpy()
+        holes = (nos // 500) % 7 == 3
+        deleted = rng.random(len(nos)) < 0.01
+        comments_df = comments_df[~(holes | deleted)]
+
+        t = perf_counter()
+        acc = CommentAccumulator()
+        acc.add(comments_df)
+        tgt_probes = plan_exactly(acc, [0], {0: w})
+        new_t = perf_counter()-t
+        new_whens = [t for _, t in tgt_probes[0]]
+
+        if n <= legacy_max:
+            t = perf_counter()
+            legacy_whens = plan_exactly_legacy(comments_df, [0], {0: w})[0]
+            legacy_t = perf_counter()-t
+            # 以前の planner は同じ時刻を重複して読み込むことがある
+            assert sorted(set(legacy_whens)) == sorted(new_whens)
+            legacy = f'legacy {legacy_t:8.3f}s ({len(legacy_whens):>6,} probes)'
+        else:
+            legacy = 'legacy   skipped'
+
+        print(
+            f'{n:>9,} comments: {legacy}  '
+            f'interval {new_t:7.3f}s ({len(new_whens):>6,} probes)'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,53 @@
+import sys
+import threading
+import requests
+from pathlib import Path
+from time import perf_counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils import session  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keep-alive を有効にするため HTTP/1.1 で応答する
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'x' * 2048
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(get, url, n):
+    t = perf_counter()
+    for _ in range(n):
+        get(url).content
+    return (perf_counter()-t) / n
+
+
+def main(n: int = 500):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+
+    fresh = measure(requests.get, url, n)
+    pooled = measure(session.get, url, n)
+
+    print(f'requests: {n}')
+    print(f'fresh connection: {fresh*1000:.3f} ms/req')
+    print(f'pooled session:   {pooled*1000:.3f} ms/req')
+    print(f'speedup: {fresh/pooled:.2f}x')
+
+    session.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
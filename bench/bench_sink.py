@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import NicovideoInfomation  # noqa: E402
+from utils import ratelimit  # noqa: E402
+from utils.sink import JsonLinesSink, ParquetSink, read_jsonl, read_parts  # noqa: E402
+from mock_server import MockNicoServer  # noqa: E402
+from bench_load import silent_tqdm  # noqa: E402
+
+
+def run(server, sink=None, keep=True):
+    ninfo = NicovideoInfomation(video_url=server.video_url)
+    t = perf_counter()
+    ninfo.load_comments(
+        mode='roughly', check=False, tqdm_fn=silent_tqdm, sink=sink, keep=keep
+    )
+    elapsed = perf_counter()-t
+
+    return ninfo.comments_df, elapsed
+
+
+def main(n: int = 50_000):
+    server = MockNicoServer(comment_num=n).start()
+    ratelimit.set_limiter(server.url, ratelimit.RateLimiter(rate=1000, max_rate=1000))
+    tmp = tempfile.mkdtemp()
+
+    try:
+        base_df, t = run(server)
+        print(f'{server.comment_num():,} comments')
+        print(f'{"memory only":<30}{t:6.2f}s  {len(base_df):>7,} rows in memory')
+
+        sinks = {
+            'jsonl.gz': (JsonLinesSink, read_jsonl, os.path.join(tmp, 'comments.jsonl.gz')),
+            'parquet parts': (ParquetSink, read_parts, os.path.join(tmp, 'parts')),
+        }
+        for name, (sink_cls, reader, path) in sinks.items():
+            with sink_cls(path, flush_rows=5000) as sink:
+                kept_df, t = run(server, sink=sink, keep=False)
+
+            loaded_df = reader(path)
+            pd.testing.assert_frame_equal(
+                loaded_df.astype(object), base_df.astype(object), check_index_type=False
+            )
+            size = sum(p.stat().st_size for p in Path(path).rglob('*')) \
+                if os.path.isdir(path) else os.path.getsize(path)
+            print(f'{name + " (keep=False)":<30}{t:6.2f}s  {len(kept_df):>7,} rows in memory'
+                  f'  {size/1e6:6.1f} MB on disk')
+
+        # 途中で落ちた場合: 末尾のメンバが壊れていても書き出し済みの分は読める
+        path = sinks['jsonl.gz'][2]
+        with open(path, mode='r+b') as f:
+            f.truncate(os.path.getsize(path) - 100)
+        print(f'truncated jsonl.gz: {len(read_jsonl(path)):,} comments recovered')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
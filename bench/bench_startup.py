@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import argparse
+import datetime
+import tempfile
+import subprocess
+from pathlib import Path
+
+
+root = Path(__file__).resolve().parents[1]
+
+# アプリの起動に関わるモジュール (上ほど起動時に必ず読み込まれるもの)
+modules = [
+    'tkinter', 'ttkthemes', 'PIL.ImageTk', 'tqdm.tk',
+    'nico_info', 'utils.parser', 'utils.columnar',
+    'nvca',
+    # 以下は使うときまで読み込まないもの
+    'wordcloud', 'utils.nlp', 'janome.tokenizer', 'sudachipy.dictionary',
+]
+
+
+def import_time(module: str, repeat: int):
+    # 新しいプロセスで import にかかる時間 [s] (最小値)
+    code = (
+        'from time import perf_counter; t = perf_counter(); '
+        f'import {module}; print(perf_counter() - t)'
+    )
+    times = []
+    for _ in range(repeat):
+        res = subprocess.run(
+            [sys.executable, '-c', code], cwd=root, capture_output=True, text=True
+        )
+        if res.returncode != 0:
+            return None, res.stderr.strip().splitlines()[-1]
+        times.append(float(res.stdout.split()[-1]))
+
+    return min(times), ''
+
+
+def first_window(repeat: int):
+    # ディスプレイがある環境でだけ，実際にアプリを起動して最初のウィンドウまでを測る
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        return None, 'no display'
+
+    results = []
+    for _ in range(repeat):
+        out = Path(tempfile.mkdtemp()) / 'startup.json'
+        env = dict(os.environ, NVCA_PROFILE_STARTUP=str(out), NVCA_PROFILE_EXIT='1')
+        res = subprocess.run(
+            [sys.executable, 'nvca.py'], cwd=root, env=env, capture_output=True, text=True
+        )
+        if res.returncode != 0 or not out.exists():
+            return None, (res.stderr.strip().splitlines() or ['failed'])[-1]
+        with open(out) as f:
+            results.append(json.load(f)['marks'])
+
+    return min(results, key=lambda m: m.get('first window', float('inf'))), ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='startup benchmark')
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('--history', help='結果を JSON Lines で追記するファイル')
+    args = parser.parse_args()
+
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'imports': {}}
+
+    print('=== import time (fresh process, best of '
+          f'{args.repeat}) ===')
+    for module in modules:
+        t, err = import_time(module, args.repeat)
+        record['imports'][module] = t
+        print(f'{module:<22}' + (f'{t*1000:8.1f} ms' if t is not None else f'  -  ({err})'))
+
+    print('=== time to first window ===')
+    marks, err = first_window(args.repeat)
+    record['marks'] = marks
+    if marks is None:
+        print(f'skipped ({err})')
+    else:
+        for name, t in marks.items():
+            print(f'{name:<22}{t*1000:8.1f} ms')
+
+    if args.history:
+        with open(args.history, mode='a') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils import thumbcache  # noqa: E402
+from utils.parser import url2img  # noqa: E402
+from mock_server import MockNicoServer  # noqa: E402
+
+
+def repaint(urls):
+    # ranking_view と同じく全サムネイルを 63x47 で取り出す
+    return [url2img(url, (63, 47)) for url in urls]
+
+
+def main(cards: int = 100, repaints: int = 5):
+    server = MockNicoServer(comment_num=10, latency=0.01).start()
+    urls = [f'{server.url}/thumbnail/sm{i}' for i in range(cards)]
+
+    try:
+        for name, conf in [
+            ('no cache', {'maxsize': 0, 'cache_dir': None}),
+            ('memory + disk', {'maxsize': 512, 'cache_dir': tempfile.mkdtemp()}),
+        ]:
+            thumbcache.configure(**conf)
+            server.reset_stats()
+            times = []
+            for _ in range(repaints):
+                t = perf_counter()
+                repaint(urls)
+                times.append(perf_counter()-t)
+            print(f'{name:<14} first {times[0]*1000:7.1f} ms  '
+                  f'later {min(times[1:])*1000:7.1f} ms  '
+                  f'{server.request_num} downloads')
+
+        # 起動し直した場合はディスクの縮小済み画像を使う
+        thumbcache.configure(maxsize=512)
+        server.reset_stats()
+        t = perf_counter()
+        repaint(urls)
+        cache = thumbcache.get_cache()
+        print(f'{"restart":<14} first {(perf_counter()-t)*1000:7.1f} ms  '
+              f'{server.request_num} downloads, {cache.disk_hits} disk hits')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nlp_corpus import make_danmaku, patch_kanjize  # noqa: E402
+patch_kanjize()
+from utils import nlp  # noqa: E402
+
+
+def main(num: int = 100000, tokenizer: str = 'janome'):
+    comments = make_danmaku(num)
+    normalized = [nlp.normalize(comment) for comment in comments]
+    normalized = [comment for comment in normalized if len(comment) > 1]
+    print(f'{num:,} comments, {len(set(normalized)):,} distinct')
+
+    # 以前と同じくコメントごとに解析したもの
+    t = perf_counter()
+    expected = [w for tokens in nlp.tokenize_comments(normalized, tokenizer=tokenizer) for w in tokens]
+    print(f'{"per comment":<12} {perf_counter()-t:7.2f}s  {len(normalized):>8,} tokenizer calls')
+
+    nlp.token_cache.clear()
+    for name in ['first call', 'second call']:
+        misses = nlp.token_cache.misses
+        t = perf_counter()
+        results = [w for tokens in nlp.tokenize_cached(normalized, tokenizer=tokenizer) for w in tokens]
+        elapsed = perf_counter()-t
+        print(f'{name:<12} {elapsed:7.2f}s  {nlp.token_cache.misses - misses:>8,} tokenizer calls  '
+              f'identical: {results == expected}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]), *sys.argv[2:])
@@ -0,0 +1,35 @@
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nlp_corpus import make_comments, patch_kanjize  # noqa: E402
+patch_kanjize()
+from utils.nlp import analyze_comments, token_cache  # noqa: E402
+
+
+def main(num: int = 50000, tokenizer: str = 'janome'):
+    comments = make_comments(num)
+    print(f'{num:,} comments, {tokenizer}, {os.cpu_count()} cpus')
+
+    # 同じコメントの解析結果の LRU が効かないように毎回空にする
+    token_cache.clear()
+    t = perf_counter()
+    expected = analyze_comments(comments, tokenizer=tokenizer)
+    serial = perf_counter()-t
+    print(f'{"serial":<10} {serial:7.2f}s')
+
+    # プロセスプールは使い回すので，2 回目からは起動と辞書の読み込みがない
+    workers = sorted({2, 4, os.cpu_count()})
+    for n in workers:
+        for run in ['cold', 'warm']:
+            token_cache.clear()
+            t = perf_counter()
+            results = analyze_comments(comments, tokenizer=tokenizer, workers=n)
+            elapsed = perf_counter()-t
+            print(f'{n:>2} workers {run} {elapsed:7.2f}s  x{serial/elapsed:4.1f}  '
+                  f'identical: {results == expected}')
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]), *sys.argv[2:])
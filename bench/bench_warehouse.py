@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from nico_info import convert_to_df  # noqa: E402
+from utils.warehouse import CommentWarehouse  # noqa: E402
+from bench_convert import make_comments  # noqa: E402
+
+
+def main(video_num: int = 20, n: int = 50_000):
+    tmp = tempfile.mkdtemp()
+    warehouse = CommentWarehouse(os.path.join(tmp, 'warehouse.db'))
+
+    dfs, insert_t = {}, 0.0
+    for i in range(video_num):
+        video_id = f'sm{i+1}'
+        comments_df = convert_to_df(make_comments(n, seed=i))
+        comments_df.to_pickle(os.path.join(tmp, f'{video_id}.pkl'))
+        dfs[video_id] = comments_df
+
+        t = perf_counter()
+        warehouse.add_video(video_id, {'title': f'video {i+1}', 'post_time': i})
+        warehouse.add_comments(video_id, comments_df)
+        insert_t += perf_counter()-t
+
+    total = video_num * n
+    print(f'{video_num} videos x {n:,} comments: insert {insert_t:.2f}s '
+          f'({total/insert_t:,.0f} rows/s)')
+
+    user_id = dfs['sm1'].user_id.dropna().iloc[0]
+
+    # pickle を全部読み直して探す場合
+    t = perf_counter()
+    found = []
+    for video_id in dfs:
+        df = pd.read_pickle(os.path.join(tmp, f'{video_id}.pkl'))
+        found.append(df[df.user_id == user_id])
+    found = pd.concat(found)
+    reload_t = perf_counter()-t
+
+    t = perf_counter()
+    rows = warehouse.user_comments(user_id)
+    query_t = perf_counter()-t
+    assert len(rows) == len(found)
+    print(f'user_id lookup: reload pickles {reload_t*1000:8.1f} ms  '
+          f'sqlite {query_t*1000:6.1f} ms ({len(rows)} rows)')
+
+    t = perf_counter()
+    busy = warehouse.query(
+        'SELECT video_id, COUNT(*) AS n FROM comments '
+        'WHERE video_time BETWEEN ? AND ? GROUP BY video_id', (10.0, 20.0)
+    )
+    print(f'video_time range count: sqlite {(perf_counter()-t)*1000:6.1f} ms '
+          f'({busy.n.sum():,} rows)')
+
+    t = perf_counter()
+    loaded_df = warehouse.load_comments('sm1')
+    print(f'load one video: sqlite {(perf_counter()-t)*1000:6.1f} ms')
+    pd.testing.assert_frame_equal(
+        loaded_df.astype(object), dfs['sm1'].astype(object), check_exact=True
+    )
+
+    warehouse.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
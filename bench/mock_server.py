@@ -0,0 +1,280 @@
+import sys
+import html
+import json
+import random
+import datetime
+import threading
+from time import sleep
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+ranking_item_html = \
+'''<div class="NC-VideoMediaObject" data-video-id="{video_id}">
+  <h2>{title}</h2>
+  <div class="NC-Thumbnail-image" data-background-image="{thumbnail}"></div>
+  <span class="NC-VideoRegisteredAtText-text">{post}</span>
+  <div class="NC-VideoMetaCount">{view}</div>
+  <div class="NC-VideoMetaCount">{comment}</div>
+  <div class="NC-VideoMetaCount">0</div>
+  <div class="NC-VideoMetaCount">0</div>
+  <div class="NC-VideoMetaCount">0</div>
+</div>
+'''
+
+watch_html = \
+'''<html lang="ja">
+  <body>
+    <div id="js-initial-watch-data" data-api-data="{api_data}"></div>
+  </body>
+</html>
+'''
+
+
+def make_thread(
+    thread_id: str, fork: int, n: int, post_time: float, now_time: float,
+    deleted: float = 0.01, seed: int = 0
+):
+    # 投稿直後ほど書き込みが多くなるような n 件のコメントを作る
+    rng = random.Random(seed)
+    span = now_time - post_time
+    dates = sorted([
+        post_time + min(span-1, rng.expovariate(1/(span/8)))
+        for _ in range(n)
+    ])
+
+    chats = []
+    for no, date in enumerate(dates, 1):
+        if rng.random() < deleted:
+            continue
+
+        chat = {
+            'thread': thread_id,
+            'no': no,
+            'vpos': rng.randint(0, 60000),
+            'date': int(date),
+            'date_usec': rng.randint(0, 999999),
+            'anonymity': 1,
+            'user_id': f'mockuser{rng.randint(0, n//5)}',
+            'mail': rng.choice(['184', '184 ue', '184 shita red', '184 big']),
+            'content': rng.choice(['草', 'www', '888', 'うぽつ', f'コメント{no}']),
+        }
+        if fork:
+            chat['fork'] = fork
+        chats.append(chat)
+
+    return chats
+
+
+class MockNicoServer():
+    def __init__(
+        self,
+        comment_num: int = 10000,
+        video_id: str = 'sm9',
+        days: int = 30,
+        leaves: int = 1000,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        deleted: float = 0.01,
+        seed: int = 0,
+        ranking_num: int = 10,
+    ):
+        # 視聴ページ (#js-initial-watch-data) と api.json を返すローカルサーバ
+        # leaves: 1 リクエストで返すコメント数
+        # latency: 1 リクエストごとの遅延 [s]
+        # throttle_rate: コメントを返さず空で応答する確率 (アクセス制限の再現)
+        # error_rate: api.json が 503 を返す確率
+        # ranking_num: ランキングページに並べる動画数
+        self.video_id = video_id
+        self.leaves = leaves
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.ranking_num = ranking_num
+        self.rng = random.Random(seed)
+
+        now_time = datetime.datetime.now().timestamp()
+        self.post_time = int(now_time - days*24*60*60)
+
+        counts = {0: comment_num, 1: max(1, comment_num//1000), 2: comment_num//10}
+        self.threads = {
+            fork: make_thread(
+                str(1000+fork), fork, num, self.post_time, now_time,
+                deleted=deleted, seed=seed+fork
+            )
+            for fork, num in counts.items()
+        }
+        self.times = {
+            fork: [c['date'] + c['date_usec']/1e6 for c in chats]
+            for fork, chats in self.threads.items()
+        }
+
+        self.request_num = 0
+        self.api_request_num = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    @property
+    def video_url(self):
+        return f'{self.url}/watch/{self.video_id}'
+
+    def comment_num(self):
+        return sum([len(chats) for chats in self.threads.values()])
+
+    def api_data(self, video_id: str = None):
+        # どの動画 ID でも同じコメントを持つ動画として振る舞う
+        video_id = video_id or self.video_id
+        registered_at = datetime.datetime.fromtimestamp(self.post_time)
+        return {
+            'video': {
+                'id': video_id,
+                'title': f'mock video {video_id}',
+                'registeredAt': registered_at.strftime('%Y-%m-%dT%H:%M:%S+09:00'),
+                'count': {
+                    'view': self.comment_num()*10,
+                    'comment': self.comment_num(),
+                    'like': 0,
+                    'mylist': 0,
+                },
+                'thumbnail': {'url': f'{self.url}/thumbnail/{video_id}'},
+            },
+            'owner': {'id': 1, 'nickname': 'mock owner'},
+            'channel': None,
+            'comment': {
+                'threads': [
+                    {
+                        'id': str(1000+fork),
+                        'fork': fork,
+                        'threadkey': '',
+                        'server': self.url,
+                    }
+                    for fork in self.threads
+                ]
+            },
+        }
+
+    def ranking_html(self, num: int = 10):
+        post = datetime.datetime.fromtimestamp(self.post_time).strftime('%Y/%m/%d %H:%M')
+        items = [
+            ranking_item_html.format(
+                video_id=f'sm{i+1}', title=f'mock video sm{i+1}',
+                thumbnail=f'{self.url}/thumbnail/sm{i+1}', post=post,
+                view=self.comment_num()*10, comment=self.comment_num()
+            )
+            for i in range(num)
+        ]
+        return f'<html><body>{"".join(items)}</body></html>'
+
+    def thumbnail(self):
+        # 本物と同程度の大きさ (360x270) の JPEG
+        if not hasattr(self, '_thumbnail'):
+            from io import BytesIO
+            from PIL import Image
+
+            buf = BytesIO()
+            Image.effect_noise((360, 270), 64).convert('RGB').save(buf, format='JPEG')
+            self._thumbnail = buf.getvalue()
+
+        return self._thumbnail
+
+    def thread_response(self, params):
+        fork = int(params.get('fork', 0))
+        when = params.get('when')
+        chats, times = self.threads[fork], self.times[fork]
+
+        # when より前に書き込まれたコメントのうち最新の leaves 件を返す
+        end = len(chats) if when is None else \
+            next((i for i, t in enumerate(times) if t >= float(when)), len(chats))
+        res = [{'thread': {'thread': str(1000+fork), 'resultcode': 0}}]
+        res.extend([{'chat': chat} for chat in chats[max(0, end-self.leaves):end]])
+
+        return res
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_num += 1
+
+                if server.latency:
+                    sleep(server.latency)
+
+                if self.path.startswith('/watch/'):
+                    video_id = self.path[len('/watch/'):].split('?')[0]
+                    data = html.escape(json.dumps(server.api_data(video_id)))
+                    self.reply(watch_html.format(api_data=data), 'text/html')
+                elif self.path.startswith('/ranking/'):
+                    self.reply(server.ranking_html(server.ranking_num), 'text/html')
+                elif self.path.startswith('/thumbnail/'):
+                    self.reply(server.thumbnail(), 'image/jpeg')
+                elif self.path.startswith('/api.json'):
+                    length = int(self.headers.get('Content-Length', 0))
+                    req = json.loads(self.rfile.read(length) or b'[]')
+                    with server._lock:
+                        server.api_request_num += 1
+                        throttled = server.rng.random() < server.throttle_rate
+                        error = server.rng.random() < server.error_rate
+
+                    if error:
+                        self.reply('<html>Service Unavailable</html>', 'text/html', 503)
+                        return
+
+                    res = []
+                    for item in req:
+                        if not throttled:
+                            res.extend(server.thread_response(item['thread']))
+                    self.reply(json.dumps(res), 'application/json')
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+
+            def reply(self, text, content_type, status=200):
+                body = text if isinstance(text, bytes) else text.encode()
+                with server._lock:
+                    server.sent_bytes += len(body)
+
+                self.send_response(status)
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def reset_stats(self):
+        with self._lock:
+            self.request_num = 0
+            self.api_request_num = 0
+            self.sent_bytes = 0
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    server = MockNicoServer(*map(int, sys.argv[1:2])).start()
+    print(f'serving {server.comment_num()} comments at {server.video_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,39 @@
+import random
+
+
+# 形態素解析のベンチマーク用のコメント (実際のコメントに多い語を適当に組み合わせる)
+words = [
+    '草', 'ｗｗｗ', 'www', '初見です', '8888', '三百円', '100円以下', '未満', 'かわいい',
+    '神回', 'ＡＢＣ', '東京タワー', '10万', '5分', '運営仕事しろ', 'ここすき', '123ｍ',
+    '二十歳', '3人', 'うぽつ', '!!', '後ろの人', '1000回目', '10分後', 'ﾜﾛﾀ', '(*´ω｀*)',
+    '弾幕', '職人', 'おかえり', '伝説の始まり', '2回目', '3年前', '５０ｍ', '？？？',
+]
+
+
+def make_comments(num: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [''.join(rng.choices(words, k=rng.randint(1, 4))) for _ in range(num)]
+
+
+def make_danmaku(num: int, distinct: int = 2000, seed: int = 0):
+    # 弾幕の多い動画のように，一部のコメントが何度も繰り返されるもの (Zipf 分布)
+    rng = random.Random(seed)
+    pool = make_comments(distinct, seed)
+    weights = [1 / (i+1) for i in range(distinct)]
+    return rng.choices(pool, weights=weights, k=num)
+
+
+def patch_kanjize():
+    # kanjize 1.x には kanji2int がない (kanji2number は数字以外で例外を出す) ので，
+    # ベンチマークの中だけ古い版と同じく数字でなければ 0 を返すものを用意する
+    import kanjize
+    if hasattr(kanjize, 'kanji2int'):
+        return
+
+    def kanji2int(kanji: str):
+        try:
+            return kanjize.kanji2number(kanji)
+        except ValueError:
+            return 0
+
+    kanjize.kanji2int = kanji2int
@@ -0,0 +1,228 @@
+import sys
+import argparse
+
+
+# 起動を速くするため，pandas や形態素解析器などの重いモジュールは
+# 各サブコマンドの中で必要になってから import する
+
+formats = ['csv', 'pkl', 'parquet', 'nca']
+
+
+def path_format(path: str):
+    # 拡張子から保存形式を決める (ディレクトリは parquet の part かアーカイブ)
+    from pathlib import Path
+
+    path = Path(path)
+    if path.suffix[1:] in formats:
+        return path.suffix[1:]
+    if path.is_dir():
+        return 'nca' if (path / 'meta.json').exists() else 'parquet'
+
+    raise SystemExit(f'unknown format: {path} ({"/".join(formats)})')
+
+
+def read_comments(path: str):
+    import pandas as pd
+
+    fmt = path_format(path)
+    if fmt == 'csv':
+        df = pd.read_csv(path, index_col='comment_id')
+    elif fmt == 'pkl':
+        df = pd.read_pickle(path)
+    elif fmt == 'parquet':
+        from utils.sink import read_parts
+        return read_parts(path)
+    else:
+        from utils.archive import CommentArchive
+        return CommentArchive(path).to_df()
+
+    # csv, pkl は 'fork-no' の comment_id で保存されている
+    if df.index.name == 'comment_id':
+        fork_no = df.index.str.split('-', expand=True)
+        df.index = pd.MultiIndex.from_arrays(
+            [fork_no.get_level_values(0).astype(int), fork_no.get_level_values(1).astype(int)],
+            names=['fork', 'no']
+        )
+
+    return df
+
+
+def write_comments(comments_df, path: str):
+    from nico_info import to_export_df
+
+    fmt = path_format(path)
+    if fmt == 'csv':
+        to_export_df(comments_df).to_csv(path)
+    elif fmt == 'pkl':
+        to_export_df(comments_df).to_pickle(path)
+    elif fmt == 'parquet':
+        from utils.columnar import save_parquet
+        save_parquet(comments_df, path)
+    else:
+        from utils.archive import save_archive
+        save_archive(comments_df, path)
+
+
+def cmd_fetch(args):
+    from nico_info import NicovideoInfomation
+
+    video = args.video
+    ninfo = NicovideoInfomation(video_url=video) if '/' in video \
+        else NicovideoInfomation(video_id=video)
+
+    if args.concurrency:
+        import asyncio
+        asyncio.run(ninfo.load_comments_async(
+            forks=args.forks, mode=args.mode, check=False,
+            concurrency=args.concurrency
+        ))
+    else:
+        from functools import partial
+        from tqdm.auto import tqdm
+        ninfo.load_comments(
+            forks=args.forks, mode=args.mode, check=False,
+            tqdm_fn=partial(tqdm, disable=args.quiet),
+            incremental=args.incremental
+        )
+
+    comments_df = ninfo.comments_df
+    out = args.out or f'{ninfo.video_id}.parquet'
+    write_comments(comments_df, out)
+    print(
+        f'{ninfo.video_id}: {len(comments_df):,} comments '
+        f'({ninfo.video_counter["comment"]:,} on the page) -> {out}'
+    )
+
+
+def cmd_extract(args):
+    from nico_info import extract_comments
+
+    comments_df = extract_comments(
+        read_comments(args.input),
+        comment=' '.join(args.comment),
+        user_id=' '.join(args.user_id),
+        forks=args.forks,
+        position=args.position,
+        size=args.size,
+        color=args.color,
+    )
+
+    if args.out:
+        write_comments(comments_df, args.out)
+        print(f'{len(comments_df):,} comments -> {args.out}')
+    else:
+        for t, c in zip(comments_df.video_time, comments_df.comment):
+            print(f'{t:8.2f}  {c}')
+
+
+def cmd_stats(args):
+    import pandas as pd
+    from nico_info import select_fork, memory_report
+
+    comments_df = read_comments(args.input)
+    forks = sorted(set(comments_df.index.get_level_values('fork')))
+
+    rows = {}
+    for fork in forks + ['total']:
+        df = comments_df if fork == 'total' else select_fork(comments_df, fork)
+        max_no = sum(
+            select_fork(comments_df, f).index.get_level_values('no').max() for f in forks
+        ) if fork == 'total' else df.index.get_level_values('no').max()
+        users = df.user_id.nunique()
+        rows[fork] = {
+            'comments': len(df),
+            'users': users,
+            'comment/user': len(df) / users if users else float('nan'),
+            'max no': max_no,
+            'acquisition rate': len(df) / max_no if max_no else float('nan'),
+        }
+
+    stats_df = pd.DataFrame(rows).T
+    print(stats_df.to_string(formatters={
+        'comments': '{:,.0f}'.format, 'users': '{:,.0f}'.format,
+        'comment/user': '{:.2f}'.format, 'max no': '{:,.0f}'.format,
+        'acquisition rate': '{:.2%}'.format,
+    }))
+
+    if args.top:
+        print()
+        print(comments_df.user_id.value_counts().head(args.top).to_string())
+    if args.memory:
+        print()
+        print(memory_report(comments_df).to_string(float_format='{:.1f}'.format))
+
+
+def cmd_wordcloud(args):
+    from wordcloud import WordCloud
+    from utils.nlp import analyze_comments
+
+    comments_df = read_comments(args.input)
+    results = analyze_comments(
+        comments_df.comment, tokenizer=args.tokenizer, workers=args.workers or None
+    )
+
+    wordcloud = WordCloud(
+        background_color='white',
+        font_path=args.font,
+        width=args.width,
+        height=args.height,
+        max_words=args.max_words
+    ).generate(' '.join(results))
+    wordcloud.to_file(args.out)
+    print(f'{len(results):,} words -> {args.out}')
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description='ニコニコ動画のコメント取得と簡単な解析'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch = subparsers.add_parser('fetch', help='コメントを取得して保存する')
+    fetch.add_argument('video', help='動画 ID または URL')
+    fetch.add_argument('-m', '--mode', default='roughly', choices=['once', 'roughly', 'exactly'])
+    fetch.add_argument('-f', '--forks', nargs='+', type=int, default=[0, 1, 2])
+    fetch.add_argument('-o', '--out', help=f'保存先 ({"/".join(formats)})')
+    fetch.add_argument('-c', '--concurrency', type=int, default=0, help='0 以外なら非同期で取得')
+    fetch.add_argument('-i', '--incremental', action='store_true')
+    fetch.add_argument('-q', '--quiet', action='store_true')
+    fetch.set_defaults(func=cmd_fetch)
+
+    extract = subparsers.add_parser('extract', help='保存したコメントを絞り込む')
+    extract.add_argument('input')
+    extract.add_argument('--comment', nargs='+', default=[], help='すべてを含むコメント')
+    extract.add_argument('--user-id', nargs='+', default=[])
+    extract.add_argument('--forks', nargs='+', type=int)
+    extract.add_argument('--position', nargs='+')
+    extract.add_argument('--size', nargs='+')
+    extract.add_argument('--color', nargs='+')
+    extract.add_argument('-o', '--out', help='省略すると標準出力に表示')
+    extract.set_defaults(func=cmd_extract)
+
+    stats = subparsers.add_parser('stats', help='取得率やユーザ数などを表示する')
+    stats.add_argument('input')
+    stats.add_argument('--top', type=int, default=0, help='コメント数の多いユーザを表示')
+    stats.add_argument('--memory', action='store_true', help='列ごとのメモリ使用量を表示')
+    stats.set_defaults(func=cmd_stats)
+
+    wordcloud = subparsers.add_parser('wordcloud', help='WordCloud の画像を出力する')
+    wordcloud.add_argument('input')
+    wordcloud.add_argument('-o', '--out', default='wordcloud.png')
+    wordcloud.add_argument('-t', '--tokenizer', default='janome', choices=['janome', 'sudachi'])
+    wordcloud.add_argument('-w', '--workers', type=int, default=1, help='形態素解析のプロセス数 (0 なら CPU 数)')
+    wordcloud.add_argument('--font', default='/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc')
+    wordcloud.add_argument('--width', type=int, default=600)
+    wordcloud.add_argument('--height', type=int, default=450)
+    wordcloud.add_argument('--max-words', type=int, default=500)
+    wordcloud.set_defaults(func=cmd_wordcloud)
+
+    return parser
+
+
+def main(argv: list = None):
+    args = make_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
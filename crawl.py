@@ -0,0 +1,137 @@
+import sys
+import argparse
+import datetime
+import pandas as pd
+from pathlib import Path
+from time import perf_counter
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm.auto import tqdm
+
+from nico_info import NicovideoInfomation
+from utils import ratelimit
+from utils.parser import fetch_ranking_info, genres_dict, terms_dict, ranking_url
+from utils.sink import ParquetSink
+
+
+def resolve_videos(genres: list, terms: list, limit: int = None, base_url: str = None):
+    # ランキングページから動画の URL とタイトルを集める (重複は除く)
+    videos = {}
+    for genre in genres:
+        for term in terms:
+            url = ranking_url(genre, term) if base_url is None \
+                else ranking_url(genre, term, base_url)
+            info = fetch_ranking_info(url) or {}
+            for i, d in sorted(info.items())[:limit]:
+                videos.setdefault(d['url'], dict(d, genre=genre, term=term))
+
+    return list(videos.values())
+
+
+def crawl_video(video: dict, out_dir: Path, mode: str, forks: list):
+    # 取得したそばから out_dir/{video_id}/ に書き出すので，
+    # 途中で止まってもそこまでのコメントは残る
+    t = perf_counter()
+    summary = {
+        'video_id': video['url'].split('/')[-1], 'title': video['title'],
+        'genre': video['genre'], 'term': video['term'],
+        'comments': 0, 'total': None, 'rate': None, 'time': None, 'status': 'ok',
+    }
+
+    try:
+        ninfo = NicovideoInfomation(video_url=video['url'])
+        summary['video_id'] = ninfo.video_id
+        summary['total'] = ninfo.video_counter['comment']
+
+        with ParquetSink(out_dir / ninfo.video_id) as sink:
+            try:
+                ninfo.load_comments(
+                    forks=forks, mode=mode, check=False,
+                    tqdm_fn=partial(tqdm, disable=True), sink=sink, keep=False
+                )
+            finally:
+                summary['comments'] = sink.written + sink.buffered
+    except ratelimit.BudgetExceeded:
+        summary['status'] = 'budget'
+    except Exception as e:
+        summary['status'] = f'error: {e!r}'
+
+    summary['time'] = perf_counter() - t
+    if summary['total']:
+        summary['rate'] = summary['comments'] / summary['total']
+
+    return summary
+
+
+def crawl(
+    genres: list, terms: list,
+    out_dir: str = 'crawl', mode: str = 'roughly', forks: list = [0, 1, 2],
+    workers: int = 4, budget: int = None, limit: int = None, base_url: str = None,
+):
+    # ランキングの取得も含めて全体で budget 回までしかリクエストしない
+    request_budget = ratelimit.set_budget(budget)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    summaries = []
+    try:
+        videos = resolve_videos(genres, terms, limit, base_url)
+        print(f'{len(videos)} videos, {workers} workers, budget {budget or "-"} requests')
+
+        with ThreadPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(crawl_video, video, out_dir, mode, forks)
+                for video in videos
+            ]
+            for future in as_completed(futures):
+                s = future.result()
+                summaries.append(s)
+                rate = f'{s["rate"]:7.2%}' if s['rate'] is not None else '      -'
+                print(
+                    f'{s["video_id"]:<12} {s["comments"]:>8,} / {s["total"] or 0:>8,}'
+                    f' {rate} {s["time"]:7.1f}s  {s["status"]}'
+                )
+    finally:
+        ratelimit.set_budget(None)
+
+    if not summaries:
+        return pd.DataFrame()
+
+    summary_df = pd.DataFrame(summaries).set_index('video_id')
+    timestamp = datetime.datetime.today().strftime('%y%m%d%H%M')
+    summary_df.to_csv(out_dir / f'summary_{timestamp}.csv')
+
+    ok = summary_df.status == 'ok'
+    print(
+        f'done: {ok.sum()}/{len(summary_df)} videos, '
+        f'{summary_df.comments.sum():,} comments, '
+        f'{summary_df.time.sum():.1f}s of work'
+        + (f', {request_budget.used} requests used' if request_budget else '')
+    )
+
+    return summary_df
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='ランキングの動画のコメントをまとめて取得する')
+    parser.add_argument('-g', '--genre', nargs='+', default=['全ジャンル'], choices=list(genres_dict))
+    parser.add_argument('-t', '--term', nargs='+', default=['24時間'], choices=list(terms_dict))
+    parser.add_argument('-m', '--mode', default='roughly', choices=['once', 'roughly', 'exactly'])
+    parser.add_argument('-f', '--forks', nargs='+', type=int, default=[0, 1, 2])
+    parser.add_argument('-o', '--out', default='crawl')
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('-b', '--budget', type=int, default=None, help='全体のリクエスト数の上限')
+    parser.add_argument('-n', '--limit', type=int, default=None, help='ランキングごとの動画数')
+    parser.add_argument('--base-url', default=None)
+    args = parser.parse_args(argv)
+
+    crawl(
+        args.genre, args.term, out_dir=args.out, mode=args.mode, forks=args.forks,
+        workers=args.workers, budget=args.budget, limit=args.limit,
+        base_url=args.base_url,
+    )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,14 +1,20 @@
-import requests
 import json
+import asyncio
 import datetime
 import pandas as pd
 import numpy as np
-from time import sleep
+import requests
+from time import sleep, monotonic
 
-from bs4 import BeautifulSoup
 from tqdm.auto import tqdm
 from typing import Union, List, Callable
 
+from utils import ratelimit, metacache
+from utils.fetcher import AsyncCommentFetcher
+from utils.ranges import MissingRanges
+from utils.store import CommentStore
+from utils.sink import CommentSink
+
 
 base_params = {
     'version': '20090904',
@@ -43,7 +49,380 @@ video_html = \
 </html>
 '''
 
-cool_time = 60
+day_time = 60*60*24
+# 投稿直後・直近からこれ以上離れた時刻で空が返ってきたら制限とみなす
+throttle_margin = day_time/2
+
+
+creplace_dict = {
+    'niconicowhite': 'white2',
+    'truered': 'red2',
+    'passionorange': 'orange2',
+    'madyellow': 'yellow2',
+    'elementalgreen': 'green2',
+    'marineblue': 'blue2',
+    'nobleviolet': 'purple2'
+}
+
+chat_keys = [
+    'no', 'fork', 'date', 'date_usec', 'vpos',
+    'content', 'user_id', 'anonymity', 'score', 'mail'
+]
+
+comment_columns = [
+    'comment', 'user_id', 'write_time', 'video_time', '184',
+    'position', 'size', 'color', 'command', 'score'
+]
+
+# date_usec の桁数を求めるための閾値 (10, 100, ..., 10^18)
+usec_digits = 10**np.arange(1, 19, dtype=np.int64)
+
+
+def parse_mail(mail):
+    # mail -> (position, size, color, command, 184 の有無)
+    items = {k: v[0] for k, v in basic_commands.items()}
+    if not mail:
+        return items['position'], items['size'], items['color'], '', False
+
+    cmds = mail.split()
+    has_184 = '184' in cmds
+    if has_184:
+        _ = cmds.pop(cmds.index('184'))
+
+    cmds_set = set(cmds)
+    for k in ['position', 'size', 'color']:
+        v = cmds_set & set(basic_commands[k])
+        if v:
+            items[k] = cmds.pop(cmds.index(v.pop()))
+
+    if items['color'] in creplace_dict:
+        items['color'] = creplace_dict[items['color']]
+
+    return items['position'], items['size'], items['color'], ' '.join(cmds), has_184
+
+
+def empty_comments_df():
+    # コメントが 1 件もないときも (fork, no) の index と列はそろえておく
+    # (文字列の列は convert_to_df の infer_objects と同じ型にする)
+    return pd.DataFrame(
+        {
+            col: pd.Series(dtype=dtype) for col, dtype in zip(comment_columns, [
+                str, str, np.float64, np.float64, np.int64,
+                str, str, str, str, np.int64
+            ])
+        },
+        index=pd.MultiIndex.from_arrays(
+            [np.zeros(0, np.int64), np.zeros(0, np.int64)], names=['fork', 'no']
+        )
+    )
+
+
+def convert_to_df(comments):
+    if not comments:
+        return empty_comments_df()
+
+    # chat の dict のリストを一度に列ごとの配列へ変換する
+    raw_df = pd.DataFrame.from_records(comments, columns=chat_keys)
+
+    fork = raw_df['fork'].fillna(0).to_numpy(np.int64)
+    no = raw_df['no'].to_numpy(np.int64)
+    date = raw_df['date'].to_numpy(np.int64)
+    usec = raw_df['date_usec'].fillna(0).to_numpy(np.int64)
+    vpos = np.maximum(raw_df['vpos'].to_numpy(np.int64), 0)
+    anonymity = raw_df['anonymity'].fillna(0).to_numpy(np.int64)
+    score = raw_df['score'].fillna(0).to_numpy(np.int64)
+
+    # float(f'{date}.{date_usec}') と同じ値になるよう整数で組み立ててから割る
+    k = np.searchsorted(usec_digits, usec, side='right') + 1
+    write_time = (date*10**k + usec) / 10.0**k
+    # float(f'{vpos[:-2]}.{vpos[-2:]}') と同じく 1 桁の vpos は 1/10 秒扱い
+    video_time = np.where(vpos < 10, vpos/10, vpos/100)
+
+    # mail は種類が少ないので重複を除いてから解析する
+    codes, mails = pd.factorize(raw_df['mail'].fillna(''))
+    parsed = list(zip(*[parse_mail(mail) for mail in mails]))
+    position, size, color, command = [
+        np.array(v, dtype=object)[codes] for v in parsed[:4]
+    ]
+    has_184 = np.array(parsed[4], dtype=bool)[codes]
+    for _ in range(int(np.sum(has_184 & (anonymity != 1)))):
+        print('184 error.')
+
+    user_id = raw_df['user_id'].to_numpy(object)
+    user_id[pd.isna(user_id)] = np.nan
+
+    comments_df = pd.DataFrame(
+        dict(zip(comment_columns, [
+            raw_df['content'].to_numpy(object), user_id,
+            write_time, video_time, anonymity,
+            position, size, color, command, score
+        ])),
+        index=pd.MultiIndex.from_arrays([fork, no], names=['fork', 'no'])
+    ).infer_objects()
+
+    comments_df = comments_df[
+        ~comments_df.index.duplicated(keep='first')
+    ].sort_values('write_time')
+
+    return comments_df
+
+
+def select_fork(comments_df, fork):
+    # index のない空の DataFrame が渡されても同じ形の空の結果を返す
+    if comments_df.empty and 'fork' not in comments_df.index.names:
+        return empty_comments_df()
+
+    return comments_df[comments_df.index.get_level_values('fork') == fork]
+
+
+def comment_ids(comments_df):
+    # 表示・保存用の 'fork-no' 形式の ID
+    forks = comments_df.index.get_level_values('fork').astype(str)
+    nos = comments_df.index.get_level_values('no').astype(str)
+    return pd.Index(forks + '-' + nos, name='comment_id')
+
+
+def to_export_df(comments_df):
+    return comments_df.set_index(comment_ids(comments_df))
+
+
+def extract_comments(
+    comments_df,
+    comment: str = '',
+    user_id: str = '',
+    forks: List = None,
+    position: List = None,
+    size: List = None,
+    color: List = None,
+):
+    # comment, user_id は空白区切り (comment はすべてを含むもの)
+    # forks, position, size, color は None なら絞り込まない
+    df = comments_df
+
+    if comment:
+        df = df[
+            np.all(
+                [df.comment.str.contains(com) for com in comment.split(' ')],
+                axis=0
+            )
+        ]
+
+    if user_id:
+        df = df[df.user_id.isin(user_id.split(' '))]
+
+    conds = [np.ones(len(df), dtype=bool)]
+    if forks is not None:
+        conds.append(df.index.get_level_values('fork').isin(forks))
+    for col, values in [('position', position), ('size', size), ('color', color)]:
+        if values is not None:
+            conds.append(df[col].isin(values))
+
+    return df[np.all(conds, axis=0)].sort_values('write_time')
+
+
+def compact_df(comments_df):
+    # 種類の少ない列はカテゴリ型 (user_id も同じ文字列を 1 つだけ持つ)，
+    # 整数の列は値が収まる最小の型にしてメモリを減らす
+    if comments_df.empty:
+        return comments_df
+
+    comments_df = comments_df.astype({
+        **{
+            k: pd.CategoricalDtype(v)
+            for k, v in basic_commands.items()
+        },
+        'command': 'category',
+        'user_id': 'category',
+    })
+    for col in ['184', 'score']:
+        comments_df[col] = pd.to_numeric(comments_df[col], downcast='integer')
+
+    return comments_df
+
+
+def memory_report(comments_df):
+    # 列ごとの型とメモリ使用量 [MB]
+    usage = comments_df.memory_usage(index=True, deep=True)
+    dtypes = comments_df.dtypes.astype(str).reindex(usage.index).fillna('index')
+    report = pd.DataFrame({'dtype': dtypes, 'MB': usage / 2**20})
+    report.loc['total'] = ['', report['MB'].sum()]
+
+    return report
+
+
+class CommentAccumulator():
+    def __init__(self, keep: bool = True):
+        # 欠番の区間を fork ごとに保持し，新しいコメントだけを貯める
+        # keep=False ではコメント本体は貯めず，欠番を埋めるのに必要な
+        # コメント番号と書き込み時刻だけを持つ
+        self.keep = keep
+        self.batches = []
+        self.missing = {}
+        self.times = {}
+
+    def __len__(self):
+        return sum([missing.loaded_num() for missing in self.missing.values()])
+
+    def add(self, batch_df):
+        # 新しく取得できたコメントだけを返す
+        if batch_df.empty:
+            return batch_df
+
+        forks = batch_df.index.get_level_values('fork').to_numpy()
+        nos = batch_df.index.get_level_values('no').to_numpy()
+        write_times = batch_df.write_time.to_numpy()
+
+        mask = ~batch_df.index.duplicated()
+        for fork in np.unique(forks).tolist():
+            sel = np.flatnonzero(forks == fork)
+            missing = self.missing.setdefault(fork, MissingRanges())
+            # 最大番号以下で欠番でないものは取得済み
+            loaded = (nos[sel] <= missing.max_no) & ~missing.contains(nos[sel])
+            mask[sel[loaded]] = False
+            missing.update(nos[sel[~loaded]])
+
+            new = sel[mask[sel]]
+            self.times.setdefault(fork, []).append((nos[new], write_times[new]))
+
+        new_df = batch_df if mask.all() else batch_df[mask]
+        if self.keep and not new_df.empty:
+            self.batches.append(new_df)
+
+        return new_df
+
+    def check(self, tgt_forks):
+        # 読み込みできなかった fork は最初から存在していないものとみなして消去し，
+        # 全件読み込めている fork も消去
+        return sorted([
+            fork for fork in set(tgt_forks)
+            if fork in self.missing and len(self.missing[fork])
+        ])
+
+    def fork_times(self, fork):
+        # 取得済みのコメント番号 (昇順) とその書き込み時刻
+        chunks = self.times.get(fork, [])
+        nos = np.concatenate([c[0] for c in chunks] + [np.zeros(0, np.int64)])
+        times = np.concatenate([c[1] for c in chunks] + [np.zeros(0)])
+
+        order = np.argsort(nos, kind='stable')
+        nos, times = nos[order], times[order]
+        self.times[fork] = [(nos, times)]
+
+        return nos, times
+
+    def to_df(self):
+        if not self.batches:
+            return empty_comments_df()
+
+        comments_df = pd.concat(self.batches).sort_values('write_time')
+        self.batches = [comments_df]
+
+        return comments_df
+
+
+def make_batch(acc, comments_df, forks, phase, when=None, progress=None):
+    # iter_comments が返すバッチ: 新しく取得できたコメントと進捗・取得状況
+    return {
+        'comments': comments_df,
+        'phase': phase,
+        'when': when,
+        'progress': progress,
+        'loaded': {
+            fork: missing.loaded_num() for fork, missing in acc.missing.items()
+        },
+        'max_no': {
+            fork: missing.max_no for fork, missing in acc.missing.items()
+        },
+        'acquisition_rate': {
+            fork: missing.loaded_num()/missing.max_no
+            for fork, missing in acc.missing.items()
+        },
+        'incomplete_forks': forks,
+    }
+
+
+def plan_exactly(acc, forks, avg_cnum, min_nos: dict = {}):
+    # 取得できていないコメント番号を埋めるために読み込み直す (アンカー番号, when) を求める
+    # min_nos[fork] 以下の欠番はすでに読み込みを試したものとして対象外にする
+    tgt_probes = {}
+    for fork in forks:
+        nos, times = acc.fork_times(fork)
+
+        anchors = np.array(
+            acc.missing[fork].plan(avg_cnum[fork], min_nos.get(fork, 0)),
+            dtype=np.int64
+        )
+        # アンカー以降で最初に取得できているコメントの書き込み時刻を when にする
+        idx = np.searchsorted(nos, anchors)
+        valid = idx < len(nos)
+        anchors, idx = anchors[valid], idx[valid]
+
+        # 同じコメントを指すアンカーは 1 回の読み込みにまとめる
+        _, first = np.unique(idx, return_index=True)
+        tgt_probes[fork] = list(zip(
+            anchors[first].tolist(), times[idx[first]].tolist()
+        ))
+
+    return tgt_probes
+
+
+def settle_gaps(acc, covered: dict, settled_nos: dict = {}):
+    # 空でない応答が返ってきた番号の範囲 covered[fork] = [(lo, hi), ...] に
+    # 下から途切れずに含まれる欠番までを fork ごとの settled_no にする
+    settled = {}
+    for fork, missing in acc.missing.items():
+        spans = sorted(covered.get(fork, []))
+        r = settled_nos.get(fork, 0)
+        for lo, hi in missing:
+            if hi <= r:
+                continue
+
+            l = max(lo, r+1)
+            for c_lo, c_hi in spans:
+                if c_lo > l:
+                    break
+                l = max(l, c_hi+1)
+
+            if l <= hi:
+                r = l-1
+                break
+            r = hi
+        else:
+            r = missing.max_no
+
+        settled[fork] = int(r)
+
+    return settled
+
+
+def cool_down(limiter: ratelimit.RateLimiter, tqdm_fn: Callable = tqdm):
+    # 固定時間ではなく RateLimiter が学習した待ち時間だけ待つ
+    wait = limiter.backoff_remaining()
+    if wait <= 0:
+        return
+
+    with limiter.stalled():
+        with tqdm_fn(range(int(np.ceil(wait))), desc='Waiting', leave=False) as pbar:
+            for _ in pbar:
+                sleep(min(1, limiter.backoff_remaining()))
+                if hasattr(pbar, '_tk_window'):
+                    pbar._tk_window.update()
+
+
+class Checkpoint():
+    def __init__(self, store: CommentStore, video_id: str, acc, interval: float = 60):
+        # 長い読み込みの途中経過を interval 秒ごとに保存する
+        self.store = store
+        self.video_id = video_id
+        self.acc = acc
+        self.interval = interval
+        self.last = monotonic()
+
+    def __call__(self):
+        if self.store is not None and monotonic()-self.last >= self.interval:
+            self.store.save(self.video_id, self.acc.to_df())
+            self.last = monotonic()
+
 
 class NicovideoInfomation():
     def __init__(self, video_url: str = None, video_id: str = None):
@@ -52,12 +431,8 @@ class NicovideoInfomation():
         if video_id:
             video_url = f'https://www.nicovideo.jp/watch/{video_id}'
 
-        source = requests.get(video_url)
-
-        soup = BeautifulSoup(source.text, 'html.parser')
-        js = json.loads(
-            soup.select_one('#js-initial-watch-data').get('data-api-data')
-        )
+        # 同じ動画の視聴ページは一定時間キャッシュしたものを使う
+        js = metacache.get(video_url)
         threads = sorted(js['comment']['threads'], key=lambda x: x['fork'])
 
         if len(threads) > 3:
@@ -91,6 +466,47 @@ class NicovideoInfomation():
         self.threads = {d['fork']: d for d in threads}
 
         self.comments_df = None
+        self.stall_time = 0.0
+
+    def fetch_comments(self, forks: List, when: float = None):
+        params_dict = {
+            fork: dict(
+                **{
+                    'thread':    self.threads[fork]['id'],
+                    'fork':      self.threads[fork]['fork'],
+                    'threadkey': self.threads[fork]['threadkey'],
+                    'when': when
+                },
+                **base_params
+            )
+            for fork in forks
+        }
+
+        req = [
+            {k: params_dict[fork] for k in ['thread', 'thread_leaves']}
+            for fork in forks
+        ]
+
+        def judge(res):
+            return 'chat' in res.text or not self.is_throttled(when)
+
+        # 送り直してもエラーが返ってくるなら空の応答と同じく読み込み直しに任せる
+        try:
+            res = ratelimit.get(self.api_url, judge=judge, data=json.dumps(req))
+        except requests.HTTPError:
+            return []
+        comments = [d['chat'] for d in json.loads(res.text) if 'chat' in d]
+
+        return comments
+
+    def is_throttled(self, when: float):
+        # 投稿直後でも直近でもないのに空で返ってきた場合は制限されているとみなす
+        # (fetch_comments が RateLimiter に失敗を伝える判定と読み込み直す判定で共有する)
+        if when is None:
+            return False
+
+        now_time = datetime.datetime.now().timestamp()
+        return min(abs(now_time-when), abs(self.post_time-when)) >= throttle_margin
 
     def load_comments(
         self,
@@ -98,223 +514,202 @@ class NicovideoInfomation():
         mode: str = 'once',
         check: bool = True,
         tqdm_fn: Callable = tqdm,
+        incremental: bool = False,
+        store: CommentStore = None,
+        compact: bool = False,
+        sink: CommentSink = None,
+        keep: bool = True,
+    ):
+        # sink を渡すと取得したバッチをそのつど書き出す
+        # keep=False ならコメントをメモリに貯めない (sink 側にだけ残る)
+        if self.comments_df is not None:
+            self.comments_df = None
+
+        limiter = ratelimit.get_limiter(self.api_url)
+        stall_time = limiter.stall_time
+
+        dfs = []
+        try:
+            for batch in self.iter_comments(
+                forks, mode, tqdm_fn, incremental=incremental, store=store
+            ):
+                if batch['comments'].empty:
+                    continue
+                if sink is not None:
+                    sink.write(batch['comments'])
+                if keep:
+                    dfs.append(batch['comments'])
+        finally:
+            if sink is not None:
+                sink.flush()
+
+        self.comments_df = pd.concat(dfs).sort_values('write_time') \
+            if dfs else empty_comments_df()
+        if compact:
+            self.comments_df = compact_df(self.comments_df)
+        self.stall_time = limiter.stall_time - stall_time
+
+        if check and keep:
+            self.check_comments()
+
+        return self.comments_df
+
+    def iter_comments(
+        self,
+        forks: Union[List, int] = [0, 1, 2],
+        mode: str = 'roughly',
+        tqdm_fn: Callable = tqdm,
+        incremental: bool = False,
+        store: CommentStore = None,
     ):
+        # 読み込んだそばから新しいコメントのバッチと進捗を返す
         assert type(forks) == int or all([type(fork) == int for fork in forks])
         assert mode in ['once', 'roughly', 'exactly']
 
         if type(forks) == int:
             forks = [forks]
 
-        if self.comments_df is not None:
-            self.comments_df = None
-
-        def fetch_comments(forks, when=None):
-            params_dict = {
-                fork: dict(
-                    **{
-                        'thread':    self.threads[fork]['id'],
-                        'fork':      self.threads[fork]['fork'],
-                        'threadkey': self.threads[fork]['threadkey'],
-                        'when': when
-                    },
-                    **base_params
-                )
-                for fork in forks
+        if incremental and store is None:
+            store = CommentStore()
+
+        # 保存先がなければコメント本体は貯めずに返していく
+        acc = CommentAccumulator(keep=store is not None)
+        floor_times = {}
+        settled_nos = {}
+        if incremental:
+            # 前回までに保存したコメントから続きを読み込む
+            stored_df = store.load(self.video_id, forks)
+            if stored_df is not None:
+                yield make_batch(acc, acc.add(stored_df), forks, 'stored')
+
+            # fork ごとに前回保存した最新のコメントまで遡る (保存がなければ投稿時刻まで)
+            marks = store.marks(self.video_id)
+            floor_times = {
+                fork: marks[fork]['latest_time'] for fork in forks if fork in marks
+            }
+            settled_nos = {
+                fork: mark.get('settled_no', 0) for fork, mark in marks.items()
             }
 
-            req = [
-                {k: params_dict[fork] for k in ['thread', 'thread_leaves']}
-                for fork in forks
-            ]
-
-            res = requests.get(self.api_url, data=json.dumps(req))
-            comments = [d['chat'] for d in json.loads(res.text) if 'chat' in d]
-
-            return comments
-
-        def convert_to_df(comments):
-            comments_dict = {}
-            for com in comments:
-                default_items = {
-                    'user_id':   None,
-                    'date_usec': 0,
-                    'anonymity': 0,
-                    'fork':      0,
-                    'score':     0,
-                    'mail':      '',
-                    'position':  basic_commands['position'][0],
-                    'size':      basic_commands['size'][0],
-                    'color':     basic_commands['color'][0]
-                }
-                for k, v in default_items.items():
-                    if k not in com:
-                        com[k] = v
-
-                if com['mail']:
-                    cmds = com['mail'].split()
-                    if '184' in cmds:
-                        if com['anonymity'] != 1:
-                            print('184 error.')
-                        _ = cmds.pop(cmds.index('184'))
-
-                    cmds_set = set(cmds)
-                    check_dict = {
-                        'position': cmds_set & set(basic_commands['position']),
-                        'size':     cmds_set & set(basic_commands['size']),
-                        'color':    cmds_set & set(basic_commands['color'])
-                    }
-
-                    for k, v in check_dict.items():
-                        if v:
-                            com[k] = cmds.pop(cmds.index(v.pop()))
-
-                    creplace_dict = {
-                        'niconicowhite': 'white2',
-                        'truered': 'red2',
-                        'passionorange': 'orange2',
-                        'madyellow': 'yellow2',
-                        'elementalgreen': 'green2',
-                        'marineblue': 'blue2',
-                        'nobleviolet': 'purple2'
-                    }
-                    if com['color'] in creplace_dict:
-                        com['color'] = creplace_dict[com['color']]
-
-                    com['mail'] = ' '.join(cmds)
-
-                comment_id = f'{com["fork"]}-{com["no"]}'
-
-                vpos = '0' if com['vpos'] < 0 else str(com['vpos'])
-                write_time = float(f'{com["date"]}.{com["date_usec"]}')
-                video_time = float(f'{vpos[:-2]}.{vpos[-2:]}')
-
-                datas = {
-                    'comment':    com['content'],
-                    'user_id':    com['user_id'],
-                    'write_time': write_time,
-                    'video_time': video_time,
-                    '184':        com['anonymity'],
-                    'position':   com['position'],
-                    'size':       com['size'],
-                    'color':      com['color'],
-                    'command':    com['mail'],
-                    'score':      com['score']
-                }
-                datas = {
-                    k: v if v is not None else np.nan
-                    for k, v in datas.items()
-                }
-
-                comments_dict[comment_id] = datas
-
-            comments_df = pd.DataFrame.from_dict(comments_dict, orient='index')
-            if comments_dict:
-                comments_df.sort_values('write_time', inplace=True)
-                comments_df.index.name = 'comment_id'
-
-            return comments_df
-
-        def merge_df(a_df, b_df):
-            if a_df.empty and b_df.empty:
-                return sorted([a_df, b_df], key=lambda x: len(x.columns))[-1]
-            elif a_df.empty:
-                return b_df
-            elif b_df.empty:
-                return a_df
-            else:
-                ab_df = pd.merge(
-                    a_df.reset_index(), b_df.reset_index(), how='outer'
-                ).set_index('comment_id').sort_values('write_time')
-                return ab_df
-
-        def check_df(comments_df, tgt_forks):
-            got_forks = set(map(int, set(comments_df.index.str[0])))
-            tgt_forks = set(tgt_forks)
-            # 読み込みできなかった fork は最初から存在していないものとみなして消去
-            for fork in tgt_forks.copy():
-                if fork not in got_forks:
-                    tgt_forks.remove(fork)
-
-            # 全件読み込めている fork は消去
-            for fork in tgt_forks.copy():
-                fork_df = comments_df[comments_df.index.str[0] == str(fork)]
-                cids = sorted(list(map(int, fork_df.index.str[2:])))
-                if cids[-1] == len(cids):
-                    tgt_forks.remove(fork)
-
-            return sorted(list(tgt_forks))
+        # 欠番を埋める読み込みが進まなくなるまで回ったときだけ，
+        # 読み込みを試し終えた欠番の上限を fork ごとに settled_no として保存する
+        settled = {}
+        try:
+            settled = yield from self._crawl(
+                acc, forks, mode, floor_times, settled_nos, store, tqdm_fn,
+                incremental=incremental
+            )
+        finally:
+            # 中断されても取得できた分は保存しておき，次回そこから再開する
+            if store is not None:
+                store.save(self.video_id, acc.to_df(), settled=settled)
+
+    def _crawl(
+        self, acc, forks, mode, floor_times, settled_nos, store, tqdm_fn,
+        incremental=False
+    ):
+        fetch_comments = self.fetch_comments
+        limiter = ratelimit.get_limiter(self.api_url)
 
         post_time = self.post_time
+        checkpoint = Checkpoint(store, self.video_id, acc)
 
         now_time = datetime.datetime.now().timestamp()
-        now_df = convert_to_df(fetch_comments(forks))
+        # コメントのある動画なのに空で返ってきたら制限とみなして読み込み直す
+        for _ in range(3):
+            latest_df = convert_to_df(fetch_comments(forks))
 
-        comments_df = now_df
-        forks = check_df(comments_df, forks)
+            if not latest_df.empty or not self.video_counter.get('comment'):
+                break
+            else:
+                limiter.failure()
+                # Cooling
+                cool_down(limiter, tqdm_fn)
 
-        if mode == 'once' or not forks:
-            self.comments_df = comments_df
-            if check:
-                self.check_comments()
+        new_df = acc.add(latest_df)
+        forks = acc.check(forks)
+        yield make_batch(acc, new_df, forks, 'latest', progress=0.0)
 
-            return comments_df
+        if mode == 'once' or not forks:
+            return {}
 
         # 1時間前のコメントを基準にしてそこから遡って読み込む
+        # (最新のコメントに 1 時間より前のものがある fork が空なら制限とみなす)
         tmp_time = now_time - 60*60*1
-        tmp_df = convert_to_df(fetch_comments(forks, when=tmp_time))
+        expected = [
+            fork for fork in forks
+            if select_fork(latest_df, fork).write_time.min() < tmp_time
+        ]
+        for _ in range(3):
+            tmp_df = convert_to_df(fetch_comments(forks, when=tmp_time))
+
+            if all([len(select_fork(tmp_df, fork)) for fork in expected]):
+                break
+            else:
+                limiter.failure()
+                # Cooling
+                cool_down(limiter, tqdm_fn)
 
-        comments_df = merge_df(comments_df, tmp_df)
-        forks = check_df(comments_df, forks)
+        new_df = acc.add(tmp_df)
+        forks = acc.check(forks)
+        yield make_batch(acc, new_df, forks, 'roughly', tmp_time, 0.0)
 
         avg_cnum = {
-            fork: len(tmp_df[tmp_df.index.str[0] == str(fork)])
+            fork: len(select_fork(tmp_df, fork)) or len(select_fork(latest_df, fork))
             for fork in forks
         }
 
+        # 遡る必要がなくなった fork は外していく
+        rough_forks = forks
+
         try_num = 1+1
-        day_time = 60*60*24
         with tqdm_fn(total=int(now_time-post_time), leave=False) as pbar:
-            while forks:
+            while rough_forks:
                 try_num += 1
-                fork2tmp = {
-                    fork: tmp_df[tmp_df.index.str[0] == str(fork)]
-                    for fork in forks
-                }
+                fork2tmp = {fork: select_fork(tmp_df, fork) for fork in rough_forks}
 
                 tmp_times = []
-                for fork in forks:
+                for fork in rough_forks:
                     fork_df = fork2tmp[fork]
+                    # この時刻より前のコメントが返ってこなかった fork は基準にしない
+                    if fork_df.empty:
+                        continue
+
                     for i, t in enumerate(fork_df.write_time):
-                        if len(fork_df) <= 1:
+                        if len(fork_df) <= i+1:
                             break
-                        elif abs(t-fork_df.write_time[i+1]) < day_time/2:
+                        elif abs(t-fork_df.write_time.iloc[i+1]) < day_time/2:
                             break
                     else:
-                        t = fork_df.write_time[0]
+                        t = fork_df.write_time.iloc[0]
 
                     tmp_times.append(t)
+
+                if not tmp_times:
+                    break
                 tgt_time = max(tmp_times)
 
                 for _ in range(3):
-                    tgt_df = convert_to_df(fetch_comments(forks, when=tgt_time))
+                    tgt_df = convert_to_df(fetch_comments(rough_forks, when=tgt_time))
 
-                    if not tgt_df.empty or \
-                    min(abs(now_time-tgt_time), abs(post_time-tgt_time)) < day_time:
+                    if not tgt_df.empty or not self.is_throttled(tgt_time):
                         break
                     else:
                         pbar.set_description(f'Loading roughly [{try_num}]')
                         try_num += 1
                         # Cooling
-                        with tqdm_fn(range(cool_time), desc='Waiting', leave=False) as pbar2:
-                            if hasattr(pbar2, '_tk_window'):
-                                _ = [(sleep(1), pbar2._tk_window.update()) for _ in pbar2]
-                            else:
-                                _ = [sleep(1) for _ in pbar2]
+                        cool_down(limiter, tqdm_fn)
                 else:
                     break
 
-                comments_df = merge_df(comments_df, tgt_df)
-                forks = check_df(comments_df, forks)
+                new_df = acc.add(tgt_df)
+                forks = acc.check(forks)
+                rough_forks = acc.check(rough_forks)
+                checkpoint()
+                yield make_batch(
+                    acc, new_df, forks, 'roughly', tgt_time,
+                    min(1.0, (now_time-tgt_time)/(now_time-post_time))
+                )
 
                 pbar.set_postfix(
                     date=str(datetime.datetime.fromtimestamp(tgt_time).date()),
@@ -327,84 +722,69 @@ class NicovideoInfomation():
 
                 comp_list = [
                     not (
-                        set(tgt_df[tgt_df.index.str[0] == str(fork)].index) - \
-                        set(tmp_df[tmp_df.index.str[0] == str(fork)].index)
+                        set(select_fork(tgt_df, fork).index) - \
+                        set(select_fork(tmp_df, fork).index)
                     )
-                    for fork in forks
+                    for fork in rough_forks
                 ]
 
                 if all(comp_list):
                     break
 
+                # 前回保存した最新のコメントまで遡れた fork は，それより前は欠番だけを埋める
+                rough_forks = [
+                    fork for fork in rough_forks
+                    if tgt_time > floor_times.get(fork, post_time)
+                ]
+
                 tmp_time, tmp_df = tgt_time, tgt_df
 
             pbar.update(pbar.total-pbar.n)
 
-        if mode == 'exactly':
-            comments_df.sort_values('write_time', inplace=True)
-            fork2com = {
-                fork: comments_df[comments_df.index.str[0] == str(fork)]
-                for fork in forks
-            }
-            unload_cids = {
-                fork: sorted(list(
-                        set(range(1, int(fork2com[fork].index[-1][2:])+1)) - \
-                        set(map(int, fork2com[fork].index.str[2:]))
-                    ))
-                for fork in forks
-            }
-
-            tgt_cids = {fork: [] for fork in forks}
-            for fork in forks:
-                w = avg_cnum[fork]
-                max_cid = int(fork2com[fork].index[-1][2:])
-                l_cid = unload_cids[fork][0]
-                r_cid = min(l_cid + w, max_cid)
-
-                if r_cid != max_cid:
-                    tgt_cids[fork].append(r_cid)
-
-                for i in range(1, len(unload_cids[fork])):
-                    cid = unload_cids[fork][i]
-                    if r_cid < cid:
-                        l_cid = cid
-                        r_cid = min(l_cid + w, max_cid)
-
-                        if r_cid != max_cid:
-                            tgt_cids[fork].append(r_cid)
-
-            tgt_whens = {fork: [] for fork in forks}
-            for fork in forks:
-                cids = tgt_cids[fork]
-                com_cids = sorted(list(map(int, fork2com[fork].index.str[2:])))
-                tmp = []
-                for cid in cids:
-                    for ccid in com_cids:
-                        if ccid >= cid:
-                            tmp.append(f'{fork}-{ccid}')
-                            break
-
-                tgt_whens[fork] = fork2com[fork].loc[tmp, :].write_time.values
+        # 差分読み込みでは欠番が埋まらなくなるまで繰り返す
+        # (1 周で終わる exactly や欠番を埋めない roughly では settled にしない)
+        settled = {}
+        probed = set()
+        covered = {}
+        while forks and (mode == 'exactly' or incremental):
+            loaded_num = len(acc)
+            all_replied = True
+            tgt_probes = plan_exactly(acc, forks, avg_cnum, settled_nos)
 
             for fork in forks.copy():
-                with tqdm_fn(tgt_whens[fork], desc=f'{fork}-Loading exactly', leave=False) as pbar:
-                    for tgt_time in pbar:
+                w = max(avg_cnum[fork], 1)
+                with tqdm_fn(tgt_probes[fork], desc=f'{fork}-Loading exactly', leave=False) as pbar:
+                    for i, (anchor, tgt_time) in enumerate(pbar):
+                        # 先に読み込んだ分ですでに埋まっている区間や，
+                        # 前の周回で読み込んで埋まらなかった区間は飛ばす
+                        if not acc.missing[fork].count(anchor-w, anchor) or \
+                        (fork, tgt_time) in probed:
+                            continue
+
                         for _ in range(3):
                             tgt_df = convert_to_df(fetch_comments([fork], when=tgt_time))
 
-                            if not tgt_df.empty or \
-                            min(abs(now_time-tgt_time), abs(post_time-tgt_time)) < day_time/2:
+                            if not tgt_df.empty or not self.is_throttled(tgt_time):
                                 break
                             else:
                                 # Cooling
-                                with tqdm_fn(range(cool_time), desc='Waiting', leave=False) as pbar2:
-                                    if hasattr(pbar2, '_tk_window'):
-                                        _ = [(sleep(1), pbar2._tk_window.update()) for _ in pbar2]
-                                    else:
-                                        _ = [sleep(1) for _ in pbar2]
-
-                        comments_df = merge_df(comments_df, tgt_df)
-                        forks = check_df(comments_df, forks)
+                                cool_down(limiter, tqdm_fn)
+
+                        if tgt_df.empty:
+                            # 空のままの区間は次の周回で読み込み直し，この周回は settled にしない
+                            all_replied = False
+                        else:
+                            probed.add((fork, tgt_time))
+                            nos = tgt_df.index.get_level_values('no')
+                            covered.setdefault(fork, []).append((nos.min(), nos.max()))
+
+                        new_df = acc.add(tgt_df)
+                        forks = acc.check(forks)
+                        checkpoint()
+                        yield make_batch(
+                            acc, new_df, forks, 'exactly', tgt_time,
+                            (i+1)/len(tgt_probes[fork])
+                        )
 
                         if not forks:
                             break
@@ -412,19 +792,96 @@ class NicovideoInfomation():
                         if hasattr(pbar, '_tk_window'):
                             pbar._tk_window.update()
 
-        self.comments_df = comments_df.sort_values('write_time')
+            if not forks or len(acc) == loaded_num:
+                # 空でない応答で読み込みを試せた欠番だけを settled にする
+                if all_replied:
+                    settled = settle_gaps(acc, covered, settled_nos)
+                break
+            if not incremental:
+                break
+
+        return settled
+
+    async def load_comments_async(
+        self,
+        forks: Union[List, int] = [0, 1, 2],
+        mode: str = 'roughly',
+        check: bool = True,
+        concurrency: int = 8,
+        compact: bool = False,
+    ):
+        assert type(forks) == int or all([type(fork) == int for fork in forks])
+        assert mode in ['once', 'roughly', 'exactly']
+
+        if type(forks) == int:
+            forks = [forks]
+
+        if self.comments_df is not None:
+            self.comments_df = None
+
+        post_time = self.post_time
+        now_time = datetime.datetime.now().timestamp()
+
+        limiter = ratelimit.get_limiter(self.api_url)
+        stall_time = limiter.stall_time
+
+        # 読み込んだバッチはそのつど acc にまとめる
+        acc = CommentAccumulator()
+        fetcher = AsyncCommentFetcher(
+            self.fetch_comments, concurrency=concurrency,
+            post_time=post_time, now_time=now_time, limiter=limiter,
+            on_batch=lambda _, comments: acc.add(convert_to_df(comments)),
+            is_throttled=self.is_throttled
+        )
+
+        try:
+            comments_df = await self._crawl_async(fetcher, acc, forks, mode)
+        finally:
+            fetcher.close()
+
+        self.comments_df = compact_df(comments_df) if compact else comments_df
+        self.stall_time = limiter.stall_time - stall_time
 
         if check:
             self.check_comments()
 
+        return self.comments_df
+
+    async def _crawl_async(self, fetcher, acc, forks, mode):
+        # 取得したコメントは fetcher の on_batch で acc に入る
+        post_time, now_time = fetcher.post_time, fetcher.now_time
+
+        # コメントのある動画なのに空で返ってきたら制限とみなして読み込み直す
+        await fetcher.fetch(forks, retry_empty=bool(self.video_counter.get('comment')))
+        forks = acc.check(forks)
+
+        if mode != 'once' and forks:
+            # 投稿時刻から現在までを区間に分けて並列に遡って読み込む
+            await asyncio.gather(*[
+                fetcher.crawl(fork, post_time, now_time) for fork in forks
+            ])
+            forks = acc.check(forks)
+
+        if mode == 'exactly' and forks:
+            tgt_probes = plan_exactly(acc, forks, fetcher.leaves_num)
+
+            # アンカーの時刻以前には必ずコメントがあるので空なら読み込み直す
+            await asyncio.gather(*[
+                fetcher.fetch([fork], when=tgt_time, retry_empty=True)
+                for fork in forks for _, tgt_time in tgt_probes[fork]
+            ])
+
+        return acc.to_df()
+
     def check_comments(self):
         if self.comments_df is not None:
             total_df = self.comments_df
             total_uids = set(total_df.user_id)
             total_unum, total_cnum = len(total_uids), len(total_df)
 
-            forks = sorted(list(set([cid[0] for cid in total_df.index])))
-            forks_dfs = [total_df[total_df.index.str[0] == fork] for fork in forks]
+            forks = sorted(list(set(total_df.index.get_level_values('fork'))))
+            forks_dfs = [select_fork(total_df, fork) for fork in forks]
+            max_nos = [df.index.get_level_values('no').max() for df in forks_dfs]
 
             print('=== total comments ===')
             print('user number:', total_unum)
@@ -433,12 +890,13 @@ class NicovideoInfomation():
             print('------')
             print(
                 'acquisition rate:',
-                f'{total_cnum/sum([int(df.index[-1][2:]) for df in forks_dfs]):.2%}'
+                f'{total_cnum/sum(max_nos):.2%}'
             )
+            print(f'stall time: {self.stall_time:.1f}s')
             if forks:
                 print()
 
-            for fork, fork_df in zip(forks, forks_dfs):
+            for fork, fork_df, max_no in zip(forks, forks_dfs, max_nos):
                 fork_uids = set(fork_df.user_id)
                 fork_cnum, fork_unum = len(fork_df), len(fork_uids)
 
@@ -449,7 +907,7 @@ class NicovideoInfomation():
                 print('------')
                 print(
                     'acquisition rate:',
-                    f'{fork_cnum/int(fork_df.index[-1][2:]):.2%}'
+                    f'{fork_cnum/max_no:.2%}'
                 )
                 if fork != forks[-1]:
                     print()
@@ -1,52 +1,25 @@
+from utils import startup
 import tkinter as tk
 from tkinter import ttk, filedialog
 # import tkcalendar as tkc
 import ttkthemes
-import numpy as np
 import pandas as pd
 import webbrowser
 import datetime
 from PIL import Image, ImageTk
-from wordcloud import WordCloud
 from tqdm.tk import tqdm as tqdm_tk
 
-from nico_info import NicovideoInfomation
-from utils.parser import fetch_ranking_info, fetch_video_info, url2img
-from utils.nlp import analyze_comments
-
-
-genres_dict = {
-    '全ジャンル': 'all',
-    '話題': 'hot-topic',
-    'エンターテインメント': 'entertainment',
-    'ラジオ': 'radio',
-    '音楽・サウンド': 'music_sound',
-    'ダンス': 'dance',
-    '動物': 'animal',
-    '自然': 'nature',
-    '料理': 'cooking',
-    '旅行・アウトドア': 'traveling_outdoor',
-    '乗り物': 'vehicle',
-    'スポーツ': 'sports',
-    '社会・政治・時事': 'society_politics_news',
-    '技術・工作': 'technology_craft',
-    '解説・講座': 'commentary_lecture',
-    'アニメ': 'anime',
-    'ゲーム': 'game',
-    'その他': 'other',
-    'R-18': 'r18'
-}
-genres_dict = {
-    k: 'genre/'+v if k != '話題' else v for k, v in genres_dict.items()
-}
-
-terms_dict = {
-    '毎時': 'hour',
-    '24時間': '24h',
-    '週間': 'week',
-    '月間': 'month',
-    '全期間': 'total'
-}
+from nico_info import (
+    NicovideoInfomation, select_fork, comment_ids, to_export_df, extract_comments
+)
+from utils.parser import (
+    fetch_ranking_info, fetch_video_info, url2img,
+    genres_dict, terms_dict, ranking_url
+)
+from utils.columnar import save_parquet
+
+startup.mark('imports')
+
 
 PANE1_W = 700
 PANE2_W = 1000
@@ -127,10 +100,10 @@ class Application(ttk.Frame):
         }
         self.comments_df = pd.DataFrame(
             columns=[
-                'comment_id', 'comment', 'user_id', 'write_time', 'video_time',
+                'fork', 'no', 'comment', 'user_id', 'write_time', 'video_time',
                 '184', 'position', 'size', 'color', 'command', 'score'
             ]
-        ).set_index('comment_id')
+        ).set_index(['fork', 'no'])
 
         self.pane1_frame = pane1_frame
         self.pane2_frame = pane2_frame
@@ -150,11 +123,33 @@ class Application(ttk.Frame):
 
     def pane2_set(self):
         self.tabs_set()
-        self.control_tab_set()
-        self.comment_tab_set()
-        self.wordcloud_tab_set()
 
-        self.card_view()
+        # タブの中身と動画カードは最初のウィンドウを出してから作る
+        # (コメント・WordCloud のタブは使われるまで作らない)
+        self.built_tabs = set()
+        self.tabs_notebook.bind(
+            '<<NotebookTabChanged>>',
+            lambda event: self.build_tab(self.tabs_notebook.index('current'))
+        )
+        self.after_idle(self.build_tab, self.tabs_dict['control'])
+        self.after_idle(self.card_view)
+
+    def build_tab(self, tab_id: int):
+        if tab_id in self.built_tabs:
+            return
+        self.built_tabs.add(tab_id)
+
+        tab_set = {
+            self.tabs_dict['control']: self.control_tab_set,
+            self.tabs_dict['comment']: self.comment_tab_set,
+            self.tabs_dict['wordcloud']: self.wordcloud_tab_set,
+        }[tab_id]
+        tab_set()
+
+        if tab_id == self.tabs_dict['wordcloud']:
+            # 形態素解析器の辞書は WordCloud のタブを開いた時点で裏で読み込んでおく
+            from utils import nlp
+            nlp.preload(['sudachi'])
 
     def input_panel_set(self):
         # === panel frame ===
@@ -389,7 +384,7 @@ class Application(ttk.Frame):
                         var, button = b_dict['var'], b_dict['checkbutton']
 
                         if b_type == 'forks':
-                            vals = df.index.str[0]
+                            vals = df.index.get_level_values('fork').values
                         else:
                             vals = df[b_type].values
 
@@ -402,17 +397,16 @@ class Application(ttk.Frame):
 
             def check_overview(overview):
                 df, org_df = self.comments_df, self.org_df
-                forks = sorted(list(set(df.index.str[0])))
+                forks = sorted(list(set(df.index.get_level_values('fork'))))
                 overview.delete(*overview.get_children())
 
-                c_dict = {'0': '一般コメント', '1': '投稿者コメント', '2': 'かんたんコメント'}
+                c_dict = {0: '一般コメント', 1: '投稿者コメント', 2: 'かんたんコメント'}
                 c_nums, rows = [], []
                 for fork in forks:
-                    got = df[df.index.str[0]==fork]
-                    org = org_df[org_df.index.str[0]==fork]
-                    c_indices = list(map(int, org.index.str[2:]))
+                    got = select_fork(df, fork)
+                    org = select_fork(org_df, fork)
                     c_got_num = len(got)
-                    c_nums.append(max(c_indices))
+                    c_nums.append(org.index.get_level_values('no').max())
                     u_got_num = len(set(got.user_id))
 
                     rows.append(
@@ -476,15 +470,17 @@ class Application(ttk.Frame):
                     parent=self.master,
                     title='save',
                     initialfile=f'{timestamp}_{vid}',
-                    filetypes=[('csv', '.csv'), ('pickle', '.pkl')],
+                    filetypes=[('csv', '.csv'), ('pickle', '.pkl'), ('parquet', '.parquet')],
                     initialdir = "./",
                     defaultextension='csv'
                 )
                 extension = filename.split('.')[-1]
                 if extension == 'csv':
-                    self.org_df.to_csv(filename)
+                    to_export_df(self.org_df).to_csv(filename)
                 elif extension == 'pkl':
-                    self.org_df.to_pickle(filename)
+                    to_export_df(self.org_df).to_pickle(filename)
+                elif extension == 'parquet':
+                    save_parquet(self.org_df, filename)
 
             buttons_frame = ttk.Frame(load_frame, padding=[10, 10, 10, 10])
 
@@ -587,9 +583,9 @@ class Application(ttk.Frame):
                 text='かんたんコメント'
             )
             forks_dict = {
-                '0': {'var': fork0_var, 'checkbutton': fork0_checkbutton},
-                '1': {'var': fork1_var, 'checkbutton': fork1_checkbutton},
-                '2': {'var': fork2_var, 'checkbutton': fork2_checkbutton}
+                0: {'var': fork0_var, 'checkbutton': fork0_checkbutton},
+                1: {'var': fork1_var, 'checkbutton': fork1_checkbutton},
+                2: {'var': fork2_var, 'checkbutton': fork2_checkbutton}
             }
 
             comment_frame = ttk.LabelFrame(
@@ -678,7 +674,7 @@ class Application(ttk.Frame):
             def make_opt_dict():
                 forks = [fork0_var, fork1_var, fork2_var]
                 opt_dict = {
-                    'forks': [str(i) for i, fork in enumerate(forks) if fork.get()],
+                    'forks': [i for i, fork in enumerate(forks) if fork.get()],
                     'comment': comment_var.get(),
                     'user_id': uid_var.get(),
                     'write_time': (None, None),
@@ -692,17 +688,16 @@ class Application(ttk.Frame):
 
             def check_overview(overview):
                 df, org_df = self.comments_df, self.org_df
-                forks = sorted(list(set(df.index.str[0])))
+                forks = sorted(list(set(df.index.get_level_values('fork'))))
                 overview.delete(*overview.get_children())
 
-                c_dict = {'0': '一般コメント', '1': '投稿者コメント', '2': 'かんたんコメント'}
+                c_dict = {0: '一般コメント', 1: '投稿者コメント', 2: 'かんたんコメント'}
                 c_nums, rows = [], []
                 for fork in forks:
-                    got = df[df.index.str[0]==fork]
-                    org = org_df[org_df.index.str[0]==fork]
-                    c_indices = list(map(int, org.index.str[2:]))
+                    got = select_fork(df, fork)
+                    org = select_fork(org_df, fork)
                     c_got_num = len(got)
-                    c_nums.append(len(c_indices))
+                    c_nums.append(len(org))
                     u_got_num = len(set(got.user_id))
 
                     rows.append(
@@ -740,33 +735,16 @@ class Application(ttk.Frame):
 
             def select_click_callback():
                 opt_dict = make_opt_dict()
-                df = self.org_df
-
-                if opt_dict['comment']:
-                    df = df[
-                        np.all(
-                            [
-                                df.comment.str.contains(com)
-                                for com in opt_dict['comment'].split(' ')
-                            ],
-                            axis=0
-                        )
-                    ]
 
-                if opt_dict['user_id']:
-                    df = df[df.user_id.isin(opt_dict['user_id'].split(' '))]
-
-                df = df[np.all(
-                    (
-                        df.index.str[0].isin(opt_dict['forks']),
-                        df.position.isin(opt_dict['position']),
-                        df['size'].isin(opt_dict['size']),
-                        df.color.isin(opt_dict['color'])
-                    ),
-                    axis=0
-                )].sort_values('write_time')
-
-                self.comments_df = df
+                self.comments_df = extract_comments(
+                    self.org_df,
+                    comment=opt_dict['comment'],
+                    user_id=opt_dict['user_id'],
+                    forks=opt_dict['forks'],
+                    position=opt_dict['position'],
+                    size=opt_dict['size'],
+                    color=opt_dict['color'],
+                )
 
                 check_overview(overview_treeview)
                 self.comment_view()
@@ -790,15 +768,17 @@ class Application(ttk.Frame):
                     parent=self.master,
                     title='save',
                     initialfile=f'{timestamp}_{vid}',
-                    filetypes=[('csv', '.csv'), ('pickle', '.pkl')],
+                    filetypes=[('csv', '.csv'), ('pickle', '.pkl'), ('parquet', '.parquet')],
                     initialdir = "./",
                     defaultextension='csv'
                 )
                 extension = filename.split('.')[-1]
                 if extension == 'csv':
-                    self.comments_df.to_csv(filename)
+                    to_export_df(self.comments_df).to_csv(filename)
                 elif extension == 'pkl':
-                    self.comments_df.to_pickle(filename)
+                    to_export_df(self.comments_df).to_pickle(filename)
+                elif extension == 'parquet':
+                    save_parquet(self.comments_df, filename)
 
             buttons_frame = ttk.Frame(extract_frame, padding=[10, 10, 10, 10])
 
@@ -993,21 +973,25 @@ class Application(ttk.Frame):
 
         def treeview_sort_callback(tv, col):
             # 2回クリックで昇順と降順に対応する
+            # コメントIDは (fork, no) の整数で並べる
+            # カテゴリ型 (compact) の列もカテゴリの順ではなく文字列の順で並べる
+            cols = ['fork', 'no'] if col == 'comment_id' else [col]
+            sort_key = lambda s: s.astype(object) \
+                if isinstance(s.dtype, pd.CategoricalDtype) else s
             df_sample = pd.concat([self.comments_df[:5], self.comments_df[-5:]])
             asc_sample = df_sample.sort_values(
-                [col, 'write_time'], ascending=[True, True]
-            )
-            desc_sample = df_sample.sort_values(
-                [col, 'write_time'], ascending=[False, True]
+                cols+['write_time'], ascending=[True]*len(cols)+[True], key=sort_key
             )
 
             if (df_sample.index == asc_sample.index).all():
                 self.comments_df = self.comments_df.sort_values(
-                    [col, 'write_time'], ascending=[False, True]
+                    cols+['write_time'], ascending=[False]*len(cols)+[True],
+                    key=sort_key
                 )
             else:
                 self.comments_df = self.comments_df.sort_values(
-                    [col, 'write_time'], ascending=[True, True]
+                    cols+['write_time'], ascending=[True]*len(cols)+[True],
+                    key=sort_key
                 )
 
             self.comment_view()
@@ -1038,9 +1022,7 @@ class Application(ttk.Frame):
     def ranking_view(self):
         _ = [button.destroy() for button in self.rcards_frame.winfo_children()]
 
-        genre_key = genres_dict[str(self.genre.get())]
-        term_key = terms_dict[str(self.term.get())]
-        url = f'https://www.nicovideo.jp/ranking/{genre_key}?term={term_key}'
+        url = ranking_url(str(self.genre.get()), str(self.term.get()))
         info_dict = fetch_ranking_info(url)
         self.ranking_info = info_dict
 
@@ -1054,8 +1036,7 @@ class Application(ttk.Frame):
         card_width = self.rcards_frame.winfo_width()
         with tqdm_tk(info_dict.items(), leave=False) as pbar:
             for i, d in pbar:
-                thumbnail = url2img(d['thumbnail'])
-                thumbnail = ImageTk.PhotoImage(thumbnail.resize((63, 47)))
+                thumbnail = ImageTk.PhotoImage(url2img(d['thumbnail'], (63, 47)))
                 if len(d['title']) < 50:
                     title = d['title']
                 else:
@@ -1100,8 +1081,7 @@ class Application(ttk.Frame):
             title = card_dict['title'][:90] + '…'
 
         video_text = '{title}\n{owner}・▶️{view} 💬{comment} 💕{like} 🕘{post}'
-        thumbnail = url2img(card_dict['thumbnail'])
-        thumbnail = ImageTk.PhotoImage(thumbnail.resize((102, 77)))
+        thumbnail = ImageTk.PhotoImage(url2img(card_dict['thumbnail'], (102, 77)))
 
         def card_click_callback():
             from pathlib import Path
@@ -1140,14 +1120,16 @@ class Application(ttk.Frame):
         self.card_button = card_button
 
     def comment_view(self):
+        self.build_tab(self.tabs_dict['comment'])
         if self.comment_treeview:
             comment_treeview = self.comment_treeview
             comment_treeview.delete(*comment_treeview.get_children())
 
-        df = self.comments_df.reset_index().drop(
+        df = self.comments_df.reset_index(drop=True).drop(
             [col for col in self.comments_df.columns if col not in self.columns],
             axis=1
         )
+        df.insert(0, 'comment_id', comment_ids(self.comments_df))
 
         for i in range(len(df)):
             values = [
@@ -1170,14 +1152,21 @@ class Application(ttk.Frame):
         wordcloud_canvas.photo = wordcloud
 
     def comment_load(self, **options):
-        self.ninfo.load_comments(**options)
+        self.ninfo.load_comments(compact=True, **options)
 
-        self.comments_df = self.ninfo.comments_df.copy()
-        self.org_df = self.comments_df.copy()
+        # 抽出や並べ替えは常に新しい DataFrame を作るので，コピーせずに共有する
+        self.org_df = self.ninfo.comments_df
+        self.comments_df = self.org_df
 
     def wordcloud_generate(self):
+        # 形態素解析器と WordCloud は重いので使うときに読み込む
+        from wordcloud import WordCloud
+        from utils.nlp import analyze_comments
+
         df = self.comments_df
-        results = analyze_comments(df.comment, tokenizer='sudachi')
+        # 重複を除いても解析するコメントが多いときだけ CPU の数のプロセスを使う
+        # (プロセスプールは使い回すので起動と辞書の読み込みは最初の 1 回だけ)
+        results = analyze_comments(df.comment, tokenizer='sudachi', workers=None)
         text = ' '.join(results)
 
         font_path = '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc'
@@ -1193,11 +1182,17 @@ class Application(ttk.Frame):
 
 
 def main():
+    startup.mark('main')
     win = ttkthemes.ThemedTk()
+    startup.watch_first_window(win)
     app = Application(master=win)
+    startup.mark('Application.__init__')
 
     win.mainloop()
 
 
 if __name__ == '__main__':
+    # PyInstaller でまとめたアプリでもプロセスプールを使えるようにする
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
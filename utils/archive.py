@@ -0,0 +1,155 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+archive_version = 1
+
+# 数値の列は固定長の構造化配列にまとめる
+# position/size/color/command はカテゴリ表 (meta.json) へのコード
+# user_id は重複を除いた文字列表へのコード (-1 は欠損)
+record_dtype = np.dtype([
+    ('fork', 'i1'),
+    ('no', 'i4'),
+    ('write_time', 'f8'),
+    ('video_time', 'f8'),
+    ('score', 'i4'),
+    ('184', 'i1'),
+    ('position', 'u1'),
+    ('size', 'u1'),
+    ('color', 'u2'),
+    ('command', 'u2'),
+    ('user_id', 'i4'),
+])
+code_columns = ['position', 'size', 'color', 'command']
+numeric_columns = ['write_time', 'video_time', '184', 'score']
+
+
+def check_codes(col: str, num: int):
+    # コード (0 ... num-1) が記録の型に収まらなければ黙って桁あふれするので止める
+    limit = np.iinfo(record_dtype[col]).max + 1
+    if num > limit:
+        raise ValueError(
+            f'too many distinct {col} values for the archive ({num:,} > {limit:,})'
+        )
+
+
+def encode_strings(values):
+    # 文字列を UTF-8 で連結した領域と，各要素の開始位置 (n+1 個) にする
+    encoded = [str(v).encode() for v in values]
+    offsets = np.zeros(len(encoded)+1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def decode_strings(offsets, arena, start: int = 0, stop: int = None):
+    stop = len(offsets)-1 if stop is None else stop
+    buf = arena[offsets[start]:offsets[stop]].tobytes()
+    base = offsets[start]
+    bounds = (offsets[start:stop+1] - base).tolist()
+    return [buf[s:e].decode() for s, e in zip(bounds[:-1], bounds[1:])]
+
+
+def save_archive(comments_df: pd.DataFrame, path: str):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    comments_df = comments_df.sort_values('write_time', kind='stable')
+
+    records = np.zeros(len(comments_df), dtype=record_dtype)
+    records['fork'] = comments_df.index.get_level_values('fork')
+    records['no'] = comments_df.index.get_level_values('no')
+    for col in numeric_columns:
+        records[col] = comments_df[col].to_numpy()
+
+    categories = {}
+    for col in code_columns:
+        codes, uniques = pd.factorize(comments_df[col].astype(object).fillna(''))
+        check_codes(col, len(uniques))
+        records[col] = codes
+        categories[col] = [str(v) for v in uniques]
+
+    user_codes, users = pd.factorize(comments_df['user_id'])
+    check_codes('user_id', len(users))
+    records['user_id'] = user_codes
+
+    np.save(path / 'records.npy', records)
+    for name, values in [('comment', comments_df['comment']), ('user', users)]:
+        offsets, arena = encode_strings(values)
+        np.save(path / f'{name}_offsets.npy', offsets)
+        arena.tofile(path / f'{name}_arena.bin')
+
+    with open(path / 'meta.json', mode='w') as f:
+        json.dump({
+            'version': archive_version,
+            'length': len(records),
+            'categories': categories,
+        }, f, ensure_ascii=False, indent=2)
+
+
+class CommentArchive():
+    def __init__(self, path: str):
+        # 開くだけなら全体を読み込まず，アクセスしたページだけが読み込まれる
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        assert self.meta['version'] == archive_version
+
+        self.records = np.load(self.path / 'records.npy', mmap_mode='r')
+        self.comment_offsets = np.load(self.path / 'comment_offsets.npy', mmap_mode='r')
+        self.user_offsets = np.load(self.path / 'user_offsets.npy', mmap_mode='r')
+        self.comment_arena = self.open_arena('comment_arena.bin')
+        self.user_arena = self.open_arena('user_arena.bin')
+
+    def open_arena(self, name: str):
+        # 空のファイルは memmap できない
+        if (self.path / name).stat().st_size == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(self.path / name, dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return len(self.records)
+
+    def comment(self, i: int):
+        return decode_strings(self.comment_offsets, self.comment_arena, i, i+1)[0]
+
+    def comments(self, start: int = 0, stop: int = None):
+        return decode_strings(self.comment_offsets, self.comment_arena, start, stop)
+
+    def users(self):
+        return np.array(
+            decode_strings(self.user_offsets, self.user_arena), dtype=object
+        )
+
+    def to_df(self, columns: list = None):
+        # comments_df と同じ形 ((fork, no) の索引) に変換する
+        columns = [
+            'comment', 'user_id', 'write_time', 'video_time', '184',
+            'position', 'size', 'color', 'command', 'score'
+        ] if columns is None else columns
+
+        records = self.records
+        data = {}
+        for col in columns:
+            if col == 'comment':
+                data[col] = self.comments()
+            elif col == 'user_id':
+                codes = np.asarray(records['user_id'])
+                # 欠損 (-1) は末尾に足した NaN を指す
+                users = np.append(self.users(), np.nan).astype(object)
+                data[col] = users[codes]
+            elif col in code_columns:
+                data[col] = np.array(
+                    self.meta['categories'][col], dtype=object
+                )[np.asarray(records[col])]
+            else:
+                data[col] = np.asarray(records[col]).astype(
+                    np.float64 if col.endswith('_time') else np.int64
+                )
+
+        index = pd.MultiIndex.from_arrays([
+            np.asarray(records['fork']).astype(np.int64),
+            np.asarray(records['no']).astype(np.int64),
+        ], names=['fork', 'no'])
+
+        return pd.DataFrame(data, index=index, columns=columns).infer_objects()
@@ -0,0 +1,76 @@
+import pandas as pd
+
+
+# 種類の少ない列は辞書エンコードして保存する
+dict_columns = ['position', 'size', 'color', 'command']
+row_group_size = 64 * 1024
+
+
+def comments_schema():
+    import pyarrow as pa
+
+    # position, size, color は種類が決まっているが，command は自由に書けるので
+    # 32767 種類を超えても書き込めるよう int32 のインデックスにする
+    category = pa.dictionary(pa.int16(), pa.string())
+    free_category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('fork', pa.int8()),
+        ('no', pa.int32()),
+        ('comment', pa.string()),
+        ('user_id', pa.string()),
+        ('write_time', pa.float64()),
+        ('video_time', pa.float64()),
+        ('184', pa.int8()),
+        ('position', category),
+        ('size', category),
+        ('color', category),
+        ('command', free_category),
+        ('score', pa.int32()),
+    ])
+
+
+def save_parquet(
+    comments_df: pd.DataFrame, path: str,
+    row_group_size: int = row_group_size, compression: str = 'zstd'
+):
+    # write_time 順に並べて書き込むことで，行グループごとの統計情報から
+    # 時刻での絞り込みが効くようにする
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = comments_schema()
+    df = comments_df.sort_values('write_time', kind='stable').reset_index()
+    df = df.astype({
+        col: 'category' for col in dict_columns
+    }).astype({
+        col: object for col in ['comment', 'user_id']
+    })
+
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+    pq.write_table(
+        table, path,
+        row_group_size=row_group_size,
+        compression=compression,
+        use_dictionary=dict_columns + ['user_id'],
+        write_statistics=True,
+    )
+
+
+def load_parquet(
+    path: str, columns: list = None, filters: list = None, index: bool = True
+):
+    # columns: 読み込む列 (射影)，filters: pyarrow の述語 (行グループ単位で読み飛ばす)
+    # 例) load_parquet(path, ['comment', 'video_time'], [('write_time', '>=', t)])
+    import pyarrow.parquet as pq
+
+    if columns is not None and index:
+        columns = ['fork', 'no'] + [c for c in columns if c not in ('fork', 'no')]
+
+    table = pq.read_table(path, columns=columns, filters=filters)
+    comments_df = table.to_pandas()
+
+    if index and {'fork', 'no'} <= set(comments_df.columns):
+        comments_df = comments_df.astype({'fork': 'int64', 'no': 'int64'})
+        comments_df = comments_df.set_index(['fork', 'no'])
+
+    return comments_df
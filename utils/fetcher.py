@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable
+
+
+class AsyncCommentFetcher():
+    def __init__(
+        self,
+        fetch_fn: Callable,
+        concurrency: int = 8,
+        post_time: float = None,
+        now_time: float = None,
+        limiter=None,
+        retries: int = 3,
+        on_batch: Callable = None,
+        is_throttled: Callable = None,
+    ):
+        # fetch_fn(forks, when) -> chat の dict のリスト
+        # is_throttled(when) -> 空の応答を制限によるものとみなすか
+        # (NicovideoInfomation.fetch_comments, is_throttled を想定)
+        # on_batch(forks, comments) -> 読み込みのたびにイベントループ上で呼ばれる
+        # (crawl で遡って読み込んだコメントはこれで受け取る)
+        assert concurrency > 0
+
+        self.fetch_fn = fetch_fn
+        self.concurrency = concurrency
+        self.post_time = post_time
+        self.now_time = now_time
+        self.limiter = limiter
+        self.retries = retries
+        self.on_batch = on_batch
+        self.is_throttled = is_throttled or (lambda when: False)
+
+        # fork ごとに 1 リクエストで返ってきたコメント数の最大値
+        self.leaves_num = {}
+        self.request_num = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+
+    async def fetch(self, forks: List, when: float = None, retry_empty: bool = False):
+        # retry_empty=True はコメントがあるはずの時刻を読み込むとき用で，
+        # 投稿直後や直近でも空なら制限されたものとして読み込み直す
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retries):
+            async with self._semaphore:
+                self.request_num += 1
+                comments = await loop.run_in_executor(
+                    self._executor, self.fetch_fn, forks, when
+                )
+
+            if comments or not (retry_empty or self.is_throttled(when)):
+                break
+
+            # 待っている間も他の区間の読み込みは続ける
+            if self.limiter is not None:
+                with self.limiter.stalled():
+                    await asyncio.sleep(self.limiter.backoff_remaining())
+
+        counts = {}
+        for com in comments:
+            fork = com.get('fork', 0)
+            counts[fork] = counts.get(fork, 0) + 1
+        for fork, num in counts.items():
+            self.leaves_num[fork] = max(self.leaves_num.get(fork, 0), num)
+
+        if self.on_batch is not None:
+            self.on_batch(forks, comments)
+
+        return comments
+
+    async def crawl(self, fork: int, start_time: float, end_time: float):
+        # [start_time, end_time] を when をずらしながら遡って読み込む
+        # コメントは投稿直後に偏るので時間で等分せず，手の空いた worker が
+        # 残りのコメント数 (コメント番号の差) が最も多い区間を半分に分けて引き取る
+        # (読み込んだコメントは on_batch に渡し，ここでは件数だけを返す)
+        state = {
+            # lo, hi: 残りの区間，cur_no: 読み込めた最小の番号，
+            # floor_no: lo の時点の番号 (下の区間の最初の応答で分かる)
+            'spans': [{
+                'lo': start_time, 'hi': end_time, 'cur_no': None, 'floor_no': 0,
+                'busy': False,
+            }],
+            'changed': asyncio.Event(),
+        }
+
+        counts = await asyncio.gather(*[
+            self.crawl_worker(fork, state) for _ in range(self.concurrency)
+        ])
+
+        return sum(counts)
+
+    def remaining(self, span: dict):
+        # まだ分からなければ None
+        if span['cur_no'] is None or span['floor_no'] is None:
+            return None
+        return span['cur_no'] - span['floor_no']
+
+    def next_span(self, fork: int, state: dict):
+        # 引き取る区間 (なければ None，待てば出てくるかもしれなければ 'wait')
+        spans = state['spans']
+        for span in spans:
+            if not span['busy']:
+                span['busy'] = True
+                return span
+
+        leaves = max(self.leaves_num.get(fork, 0), 1)
+        sizes = [(self.remaining(span), span) for span in spans]
+        candidates = [
+            (num, span) for num, span in sizes
+            if num is not None and num > leaves and span['hi']-span['lo'] > 2
+        ]
+        if not candidates:
+            return 'wait' if any([num is None for num, _ in sizes]) else None
+
+        # 上半分はそのまま今の worker が，下半分を新しい区間として引き取る
+        _, span = max(candidates, key=lambda x: x[0])
+        mid = (span['lo']+span['hi']) / 2
+        new_span = {
+            'lo': span['lo'], 'hi': mid, 'cur_no': None,
+            'floor_no': span['floor_no'], 'busy': True, 'upper': span,
+        }
+        span['lo'], span['floor_no'] = mid, None
+        spans.append(new_span)
+
+        return new_span
+
+    async def crawl_worker(self, fork: int, state: dict):
+        count = 0
+        while True:
+            span = self.next_span(fork, state)
+            if span is None:
+                return count
+            if span == 'wait':
+                await state['changed'].wait()
+                continue
+
+            count += await self.crawl_span(fork, span, state)
+
+            state['spans'] = [s for s in state['spans'] if s is not span]
+            self.notify(state)
+
+    def notify(self, state: dict):
+        state['changed'].set()
+        state['changed'] = asyncio.Event()
+
+    async def crawl_span(self, fork: int, span: dict, state: dict):
+        # 投稿直後や直近で空が返ってきても制限とみなして読み込み直し，
+        # それでも空ならその区間は諦める (残りの欠番は exactly で埋める)
+        # span['lo'] は途中で分けられると上がる
+        count = 0
+        while span['hi'] > span['lo']:
+            batch = await self.fetch([fork], when=span['hi'], retry_empty=True)
+            if not batch:
+                break
+
+            count += len(batch)
+
+            nos = [com['no'] for com in batch]
+            if span['cur_no'] is None and 'upper' in span:
+                # 上の区間の下端の番号が分かる
+                span.pop('upper')['floor_no'] = max(nos)
+            span['cur_no'] = min(nos) if span['cur_no'] is None \
+                else min(span['cur_no'], min(nos))
+            self.notify(state)
+
+            oldest = min([com['date'] for com in batch])
+            if oldest <= span['lo'] or oldest >= span['hi']:
+                break
+
+            # 同じ秒に書き込まれたコメントを取りこぼさないよう 1 秒重ねる
+            next_hi = oldest + 1
+            span['hi'] = next_hi if next_hi < span['hi'] else oldest
+
+        # 1 度も読めなかったときは上の区間の残りを多めに (この区間の分も含めて) 見積もる
+        if 'upper' in span:
+            span.pop('upper')['floor_no'] = span['floor_no']
+
+        return count
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from time import time
+from urllib.parse import urlparse
+from collections import OrderedDict
+from bs4 import BeautifulSoup
+
+from utils import ratelimit
+from utils.shared import Shared
+
+
+default_config = {
+    # メモリ上に保持する動画数
+    'maxsize': 128,
+    # 有効期限 [s]
+    'ttl': 10*60,
+    # None ならディスクには保存しない
+    'cache_dir': None,
+}
+
+# 動画ごとのロックの数
+lock_stripes = 64
+
+watch_id = re.compile(r'/watch/([^/?#]+)')
+unsafe_chars = re.compile(r'[^\w.-]')
+
+
+def cache_key(url: str):
+    # クエリ等が付いていても同じホストの同じ動画なら同じキーにする
+    m = watch_id.search(url)
+    return f'{urlparse(url).netloc}/{m.group(1)}' if m else url
+
+
+def parse_watch_data(html: str):
+    soup = BeautifulSoup(html, 'html.parser')
+    return json.loads(
+        soup.select_one('#js-initial-watch-data').get('data-api-data')
+    )
+
+
+class MetaCache():
+    def __init__(
+        self, maxsize: int = 128, ttl: float = 10*60, cache_dir: str = None
+    ):
+        # 視聴ページの js-initial-watch-data を解析した結果を
+        # LRU (メモリ) と任意でディスクに ttl 秒だけ保持する
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # キーのハッシュで振り分ける固定数のロック
+        self._key_locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def disk_path(self, key: str):
+        # キーにはホスト名 (ポート番号) が入るのでファイル名に使えない文字を置き換える
+        return self.cache_dir / (unsafe_chars.sub('_', key) + '.json')
+
+    def lookup(self, key: str):
+        now = time()
+        with self._lock:
+            if key in self.entries:
+                fetched_at, data = self.entries[key]
+                if now - fetched_at < self.ttl:
+                    self.entries.move_to_end(key)
+                    return data
+                del self.entries[key]
+
+        if self.cache_dir and self.disk_path(key).exists():
+            with open(self.disk_path(key)) as f:
+                entry = json.load(f)
+            if now - entry['fetched_at'] < self.ttl:
+                self.store(key, entry['data'], entry['fetched_at'], disk=False)
+                return entry['data']
+
+        return None
+
+    def store(self, key: str, data: dict, fetched_at: float, disk: bool = True):
+        with self._lock:
+            self.entries[key] = (fetched_at, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        if disk and self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.disk_path(key)
+            with open(f'{path}.tmp', mode='w') as f:
+                json.dump({'fetched_at': fetched_at, 'data': data}, f, ensure_ascii=False)
+            os.replace(f'{path}.tmp', path)
+
+    def get(self, url: str):
+        key = cache_key(url)
+        data = self.lookup(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        # 同じ動画を同時に取りに行かないよう動画ごとにロックする
+        # (ロックは固定数なので，キャッシュから消えた動画の分が残り続けることはない)
+        with self._key_locks[hash(key) % len(self._key_locks)]:
+            data = self.lookup(key)
+            if data is not None:
+                self.hits += 1
+                return data
+
+            self.misses += 1
+            data = parse_watch_data(ratelimit.get(url).text)
+            self.store(key, data, time())
+
+        return data
+
+    def invalidate(self, url: str):
+        key = cache_key(url)
+        with self._lock:
+            self.entries.pop(key, None)
+        if self.cache_dir and self.disk_path(key).exists():
+            self.disk_path(key).unlink()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+# 設定 (config) を変えると次の get_cache() で作り直す
+shared = Shared(MetaCache, default_config)
+config = shared.config
+
+
+def get_cache():
+    return shared.get()
+
+
+def configure(**kwargs):
+    shared.configure(**kwargs)
+
+
+def get(url: str):
+    return get_cache().get(url)
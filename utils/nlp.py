@@ -1,14 +1,241 @@
+import os
 import yaml
+import threading
 import numpy as np
+from functools import lru_cache
+from collections import OrderedDict, deque
 from kanjize import kanji2int
 
 
-def analyze_comments(
-    comments: list, pos: str = '名詞', tokenizer: str = 'janome'
-):
+class NLPRegistry():
+    def __init__(self):
+        # 形態素解析器の辞書と除外語彙をプロセスで 1 度だけ読み込んで共有する
+        # 辞書は全スレッドで共有し，解析器 (状態を持つ) はスレッドごとに作る
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        self._lexicon = None
+        self._local = threading.local()
+        self._preload = None
+        self._pools = {}
+
+    def dictionary(self, name: str):
+        with self._lock:
+            if name not in self._dictionaries:
+                if name == 'janome':
+                    # janome はシステム辞書をモジュール内でキャッシュするので，
+                    # 最初の Tokenizer を作った時点で読み込みが済む
+                    from janome.tokenizer import Tokenizer
+                    self._dictionaries[name] = Tokenizer()
+                elif name == 'sudachi':
+                    from sudachipy import dictionary
+                    try:
+                        self._dictionaries[name] = dictionary.Dictionary()
+                    except:
+                        self._dictionaries[name] = dictionary.Dictionary(dict_type='small')
+                else:
+                    raise ValueError(f'unknown tokenizer: {name}')
+
+            return self._dictionaries[name]
+
+    def tokenizer(self, name: str):
+        tokenizers = self._local.__dict__.setdefault('tokenizers', {})
+        if name not in tokenizers:
+            dic = self.dictionary(name)
+            if name == 'janome':
+                from janome.tokenizer import Tokenizer
+                tokenizers[name] = Tokenizer()
+            else:
+                tokenizers[name] = dic.create()
+
+        return tokenizers[name]
+
+    def lexicon(self):
+        with self._lock:
+            if self._lexicon is None:
+                self._lexicon = load_lexicon()
+
+            return self._lexicon
+
+    def preload(self, names: list = ['janome'], background: bool = True):
+        # background=True なら別スレッドで読み込み，そのスレッドを返す
+        def load():
+            self.lexicon()
+            for name in names:
+                self.dictionary(name)
+
+        if not background:
+            load()
+            return None
+
+        with self._lock:
+            if self._preload is None or not self._preload.is_alive():
+                self._preload = threading.Thread(target=load, daemon=True)
+                self._preload.start()
+
+            return self._preload
+
+    def pool(self, name: str, workers: int):
+        # 形態素解析用のプロセスプールは呼び出しごとに作らず使い回す
+        # (ワーカーの起動と辞書の読み込みは最初の 1 回だけで済む)
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            key = (name, workers)
+            if key not in self._pools:
+                self._pools[key] = ProcessPoolExecutor(
+                    workers, initializer=init_worker, initargs=(name,)
+                )
+
+            return self._pools[key]
+
+    def discard_pool(self, name: str, workers: int):
+        # 壊れたプールは捨てて次の呼び出しで作り直す
+        with self._lock:
+            pool = self._pools.pop((name, workers), None)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_lexicon():
+    pdir = '/'.join(__file__.split('/')[:-2])+'/'
+    with open(pdir+'data/chr.yaml', mode='rb') as f:
+        chrs = yaml.load(f, Loader=yaml.SafeLoader)
+
+    with open(pdir+'data/exclude_noun.yaml', mode='rb') as f:
+        exclude_noun = yaml.load(f, Loader=yaml.SafeLoader)
+
+    kanas = chrs['hiraganas']+chrs['katakanas']+chrs['hankanas']
+    alphabets = chrs['Alphabets']+chrs['alphabets']
+
+    units = exclude_noun.pop('units')
+    slang = exclude_noun.pop('slang')
+    n_chrs = exclude_noun.pop('n_chrs')
+
+    elems = [v for v in exclude_noun.values()] + [kanas, alphabets]
+    tmp = []
+    _ = [tmp.extend(elem) for elem in elems]
+
+    # 要素はすべて文字列なので，in での判定は集合にしても変わらない
+    return {
+        'units': frozenset(units),
+        'slang': frozenset(slang),
+        'n_chrs': frozenset(n_chrs),
+        'exclude_noun': frozenset(tmp),
+    }
+
+
+class TokenCache():
+    def __init__(self, maxsize: int = 200000):
+        # (tokenizer, pos, コメント) -> 形態素解析の結果 (tuple) の LRU
+        self.maxsize = maxsize
+        self.tokens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            if key not in self.tokens:
+                self.misses += 1
+                return None
+            self.tokens.move_to_end(key)
+            self.hits += 1
+            return self.tokens[key]
+
+    def put(self, key: tuple, tokens: tuple):
+        with self._lock:
+            self.tokens[key] = tokens
+            self.tokens.move_to_end(key)
+            while len(self.tokens) > self.maxsize:
+                self.tokens.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.tokens.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+registry = NLPRegistry()
+token_cache = TokenCache()
+
+# 重複を除いて解析するコメントがこれより少なければプロセスプールは使わない
+parallel_min = 2000
+
+# 絵文字や記号など必要ないものはまとめて除去するので，残す文字の範囲を持っておく
+keep_ranges = [
+    (44, 57),  # 記号 (, - . /) と数字
+    (65, 90),  # A-Z
+    (97, 122),  # a-z
+    (12353, 12438),  # ひらがな
+    (12449, 12534),  # カタカナ
+    (65382, 65439),  # 半角カタカナ
+    (19968, 40959),  # 漢字
+]
+keep_chars = [
+    32,  # ' '
+    37,  # '%'
+    12289,  # '、'
+    12290,  # '。'
+    12540   # 'ー'
+]
+
+zen2han = {chr(0xFF01 + i): chr(0x21 + i) for i in range(94)}
+etc_sym = {'〜': 'ー', '~': 'ー', '　': ' '}
+replace_dict = str.maketrans(dict(zen2han, **etc_sym))
+
+
+def keep_char(i: int):
+    return any(s <= i <= e for s, e in keep_ranges) or i in keep_chars
+
+
+class NormalizeTable(dict):
+    # str.translate 用の変換表 (文字コード -> 変換後の文字, 消すなら None)
+    # 全ての文字の表は大きすぎるので，出てきた文字だけ初回に判定して覚える
+    def __missing__(self, i: int):
+        c = chr(i).translate(replace_dict)
+        if not keep_char(ord(c)):
+            c = None
+        self[i] = c
+        return c
+
+
+normalize_table = NormalizeTable()
+
+
+def normalize(comment: str):
+    # 全角(アルファベット & 一部の記号) -> 半角 + 一部記号変換 + 不要な文字の大部分を除去
+    return comment.translate(normalize_table)
+
+
+def get_tokenizer(name: str = 'janome'):
+    return registry.tokenizer(name)
+
+
+def get_lexicon():
+    return registry.lexicon()
+
+
+def preload(names: list = ['janome'], background: bool = True):
+    return registry.preload(names, background)
+
+
+def tokenize_comments(comments: list, pos: str = '名詞', tokenizer: str = 'janome'):
+    # 正規化済みのコメントを 1 つずつ形態素解析して，除外語以外のリストを返す
+    # (プロセスプールの各ワーカーからも呼ぶのでモジュールの関数にしておく)
+    lexicon = get_lexicon()
+    slang = lexicon['slang']
+    n_chrs = lexicon['n_chrs']
+    exclude_noun = lexicon['exclude_noun']
+
     if tokenizer == 'janome':
-        from janome.tokenizer import Tokenizer
-        tokenizer = Tokenizer()
+        tokenizer = get_tokenizer('janome')
 
         def tokenize(comment):
             result = [
@@ -21,11 +248,8 @@ def analyze_comments(
             return [w for w in result if w]
 
     elif tokenizer == 'sudachi':
-        from sudachipy import dictionary, tokenizer
-        try:
-            tokenizer_obj = dictionary.Dictionary().create()
-        except:
-            tokenizer_obj = dictionary.Dictionary(dict_type='small').create()
+        from sudachipy import tokenizer
+        tokenizer_obj = get_tokenizer('sudachi')
 
         def tokenize(comment):
             result = [
@@ -39,108 +263,152 @@ def analyze_comments(
             ]
             return [w for w in result if w]
 
-    # 絵文字や記号など必要ないものは(力技で)まとめて除去
-    symbol_s, symbol_e = 44, 57
-    Alphabet_s, Alphabet_e = 65, 90
-    alphabet_s, alphabet_e = 97, 122
-    Hiragana_s, Hiragana_e = 12353, 12438
-    Katakana_s, Katakana_e = 12449, 12534
-    katakana_s, katakana_e = 65382, 65439
-    Kanji_s, Kanji_e = 19968, 40959
-    exceptions = [
-        32,  # ' '
-        37,  # '%'
-        12289,  # '、'
-        12290,  # '。'
-        12540   # 'ー'
+    return [
+        tuple(tokenize(comment)) if comment not in slang else ()
+        for comment in comments
     ]
 
-    zen2han = {chr(0xFF01 + i): chr(0x21 + i) for i in range(94)}
-    etc_sym = {'〜': 'ー', '~': 'ー', '　': ' '}
-    replace_dict = str.maketrans(dict(zen2han, **etc_sym))
 
-    # 全角(アルファベット & 一部の記号) -> 半角 + 一部記号変換 + 不要な文字の大部分を除去
-    def preprocess(comment):
-        result = comment.translate(replace_dict)
+def init_worker(tokenizer: str):
+    # ワーカーごとに 1 度だけ辞書と除外語彙を読み込む
+    preload([tokenizer], background=False)
 
-        def judge_mojicode(i):
-            flg = any([
-                (symbol_s <= i <= symbol_e),
-                (Alphabet_s <= i <= Alphabet_e or alphabet_s <= i <= alphabet_e),
-                (Hiragana_s <= i <= Hiragana_e),
-                (Katakana_s <= i <= Katakana_e or katakana_s <= i <= katakana_e),
-                (Kanji_s <= i <= Kanji_e),
-                (i in exceptions)
-            ])
-            return flg
 
-        result = ''.join([s for s in result if judge_mojicode(ord(s))])
+def tokenize_parallel(
+    comments: list, pos: str = '名詞', tokenizer: str = 'janome', workers: int = None
+):
+    # コメントを分割してプロセスプールで形態素解析し，元の順番に並べる
+    from functools import partial
+    from concurrent.futures.process import BrokenProcessPool
 
-        return result
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(comments) <= 1:
+        return tokenize_comments(comments, pos, tokenizer)
 
-    comments = [preprocess(comment) for comment in comments]
-    comments = [comment for comment in comments if len(comment) > 1]
+    # 負荷が偏らないようにワーカー数より多めに (連続した範囲で) 分割する
+    size = -(-len(comments) // (workers * 4))
+    chunks = [comments[i:i+size] for i in range(0, len(comments), size)]
 
-    if pos == '名詞':
-        pdir = '/'.join(__file__.split('/')[:-2])+'/'
-        with open(pdir+'data/chr.yaml', mode='rb') as f:
-            chrs = yaml.load(f, Loader=yaml.SafeLoader)
-
-        with open(pdir+'data/exclude_noun.yaml', mode='rb') as f:
-            exclude_noun = yaml.load(f, Loader=yaml.SafeLoader)
-
-        kanas = chrs['hiraganas']+chrs['katakanas']+chrs['hankanas']
-        alphabets = chrs['Alphabets']+chrs['alphabets']
-
-        units = exclude_noun.pop('units')
-        slang = exclude_noun.pop('slang')
-        n_chrs = exclude_noun.pop('n_chrs')
-
-        elems = [v for v in exclude_noun.values()] + [kanas, alphabets]
-        tmp = []
-        _ = [tmp.extend(elem) for elem in elems]
-        exclude_noun = tmp
-
-        results = []
-        for comment in comments:
-            if comment not in slang:
-                result = tokenize(comment)
-                results.extend(result)
-
-        tmp = []
-        while len(results) > 1:
-            if results[1] in units:
-                # n + 単位で表せるものは連結
-                if results[0].isdigit():
-                    k = results.pop(0)
-                elif kanji2int(results[0]) > 0:
-                    k = str(kanji2int(results.pop(0)))
-                else:
-                    k = False
+    try:
+        results = list(registry.pool(tokenizer, workers).map(
+            partial(tokenize_comments, pos=pos, tokenizer=tokenizer), chunks
+        ))
+    except BrokenProcessPool:
+        # ワーカーが落ちたらこのプロセスで解析する
+        registry.discard_pool(tokenizer, workers)
+        return tokenize_comments(comments, pos, tokenizer)
+
+    return [tokens for result in results for tokens in result]
 
+
+def tokenize_cached(
+    comments: list, pos: str = '名詞', tokenizer: str = 'janome', workers: int = 1
+):
+    # 同じコメント (草，888，歌詞のコピペなど) は 1 度だけ解析し，
+    # 解析結果は LRU に入れて次の呼び出しでも使う
+    unique = dict.fromkeys(comments)
+    missing = []
+    for comment in unique:
+        tokens = token_cache.get((tokenizer, pos, comment))
+        if tokens is None:
+            missing.append(comment)
+        else:
+            unique[comment] = tokens
+
+    # 解析するものが少なければ，このプロセスで読み込み済みの解析器を使う
+    if workers == 1 or len(missing) < parallel_min:
+        token_lists = tokenize_comments(missing, pos, tokenizer)
+    else:
+        token_lists = tokenize_parallel(missing, pos, tokenizer, workers)
+
+    for comment, tokens in zip(missing, token_lists):
+        unique[comment] = tokens
+        token_cache.put((tokenizer, pos, comment), tokens)
+
+    # 数字と単位の連結はコメントをまたぐので，元のコメントの順に並べ直す
+    return [unique[comment] for comment in comments]
+
+
+# n 回目などと表せるものの接尾辞
+# ('以下' '未満' は以前から 1 つの文字列 '以下未満' として連結されているのでそのままにする)
+number_suffixes = frozenset([
+    '目', '分', '前', '後', '以内', '以上', '以下' '未満', '強', '弱'
+])
+
+
+@lru_cache(maxsize=65536)
+def kanji_number(kanji: str):
+    # kanji2int は遅いので同じ文字列の結果は覚えておく
+    return kanji2int(kanji)
+
+
+def join_numbers(tokens, units: frozenset):
+    # n + 単位 (+ 接尾辞) で表せるものを連結する
+    # 先の 2 語だけを見ながら 1 語ずつ流すので，語数に対して線形で済む
+    tokens = iter(tokens)
+    buf = deque()
+
+    def fill(n):
+        while len(buf) < n:
+            token = next(tokens, None)
+            if token is None:
+                break
+            buf.append(token)
+
+    fill(2)
+    while len(buf) > 1:
+        if buf[1] in units:
+            # n + 単位で表せるものは連結
+            if buf[0].isdigit():
+                k = buf[0]
+            elif kanji_number(buf[0]) > 0:
+                k = str(kanji_number(buf[0]))
+            else:
+                k = False
+
+            if k:
+                buf.popleft()
+                unit = buf.popleft()
+                fill(1)
                 # さらに n 回目などと表せるものは連結
-                if k and len(results) > 1 and results[1] in [
-                    '目', '分', '前', '後', '以内', '以上', '以下' '未満', '強', '弱'
-                ]:
-                    tmp.append(k+results.pop(0)+results.pop(0))
-                elif k:
-                    tmp.append(k+results.pop(0))
+                if buf and buf[0] in number_suffixes:
+                    yield k+unit+buf.popleft()
                 else:
-                    tmp.append(results.pop(0))
-
+                    yield k+unit
             else:
-                tmp.append(results.pop(0))
+                yield buf.popleft()
+
+        else:
+            yield buf.popleft()
 
-        if results:
-            tmp.append(results.pop(0))
+        fill(2)
 
-        results = tmp
+    if buf:
+        yield buf.popleft()
+
+
+def analyze_comments(
+    comments: list, pos: str = '名詞', tokenizer: str = 'janome', workers: int = 1
+):
+    # workers が 1 以外なら，重複を除いて parallel_min 件以上のときに
+    # プロセスプールで形態素解析する (None なら CPU 数)
+    comments = [normalize(comment) for comment in comments]
+    comments = [comment for comment in comments if len(comment) > 1]
+
+    if pos == '名詞':
+        units = get_lexicon()['units']
+
+        tokens = (
+            token
+            for tokens in tokenize_cached(comments, pos, tokenizer, workers)
+            for token in tokens
+        )
 
         # 1 や 三 など 1 文字の数字は除去
         results = [
-            result for result in results
+            result for result in join_numbers(tokens, units)
             if not len(result) == 1
-            or (not result.isdigit() and kanji2int(result) == 0)
+            or (not result.isdigit() and kanji_number(result) == 0)
         ]
 
     return results
@@ -150,8 +418,7 @@ def comments2vec(comments: list, model, tokenizer: str = 'janome'):
     exclude_pos0 = [] #['助詞', '助動詞', '接頭詞', '接続詞', '連体詞', '記号', 'フィラー']
     exclude_pos1 = [] #['代名詞', '接尾', '非自立', '数']
     if tokenizer == 'janome':
-        from janome.tokenizer import Tokenizer
-        tokenizer = Tokenizer()
+        tokenizer = get_tokenizer('janome')
 
         def tokenize(comment):
             result = [
@@ -165,8 +432,8 @@ def comments2vec(comments: list, model, tokenizer: str = 'janome'):
             return [w for w in result if w]
 
     elif tokenizer == 'sudachi':
-        from sudachipy import dictionary, tokenizer
-        tokenizer_obj = dictionary.Dictionary().create()
+        from sudachipy import tokenizer
+        tokenizer_obj = get_tokenizer('sudachi')
 
         def tokenize(comment):
             result = [
@@ -181,41 +448,9 @@ def comments2vec(comments: list, model, tokenizer: str = 'janome'):
             ]
             return [w for w in result if w]
 
-    symbol_s, symbol_e = 44, 57
-    Alphabet_s, Alphabet_e = 65, 90
-    alphabet_s, alphabet_e = 97, 122
-    Hiragana_s, Hiragana_e = 12353, 12438
-    Katakana_s, Katakana_e = 12449, 12534
-    katakana_s, katakana_e = 65382, 65439
-    Kanji_s, Kanji_e = 19968, 40959
-    exceptions = [
-        32,  # ' '
-        37,  # '%'
-        12289,  # '、'
-        12290,  # '。'
-        12540   # 'ー'
-    ]
-
-    zen2han = {chr(0xFF01 + i): chr(0x21 + i) for i in range(94)}
-    etc_sym = {'〜': 'ー', '~': 'ー', '　': ' '}
-    replace_dict = str.maketrans(dict(zen2han, **etc_sym))
-
-    # 全角(アルファベット & 一部の記号) -> 半角 + 一部記号変換 + 不要な文字の大部分を除去
+    # 正規化して 10 文字未満になるものは使わない
     def preprocess(comment):
-        result = comment.translate(replace_dict)
-
-        def judge_mojicode(i):
-            flg = any([
-                (symbol_s <= i <= symbol_e),
-                (Alphabet_s <= i <= Alphabet_e or alphabet_s <= i <= alphabet_e),
-                (Hiragana_s <= i <= Hiragana_e),
-                (Katakana_s <= i <= Katakana_e or katakana_s <= i <= katakana_e),
-                (Kanji_s <= i <= Kanji_e),
-                (i in exceptions)
-            ])
-            return flg
-
-        result = ''.join([s for s in result if judge_mojicode(ord(s))])
+        result = normalize(comment)
 
         return result if len(result) >= 10 else None
 
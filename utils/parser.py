@@ -1,13 +1,51 @@
-import requests
-import json
 import datetime
+from urllib.parse import urljoin
 from bs4 import BeautifulSoup
-from io import BytesIO
-from PIL import Image
+
+from utils import ratelimit, metacache, thumbcache
+
+
+genres_dict = {
+    '全ジャンル': 'all',
+    '話題': 'hot-topic',
+    'エンターテインメント': 'entertainment',
+    'ラジオ': 'radio',
+    '音楽・サウンド': 'music_sound',
+    'ダンス': 'dance',
+    '動物': 'animal',
+    '自然': 'nature',
+    '料理': 'cooking',
+    '旅行・アウトドア': 'traveling_outdoor',
+    '乗り物': 'vehicle',
+    'スポーツ': 'sports',
+    '社会・政治・時事': 'society_politics_news',
+    '技術・工作': 'technology_craft',
+    '解説・講座': 'commentary_lecture',
+    'アニメ': 'anime',
+    'ゲーム': 'game',
+    'その他': 'other',
+    'R-18': 'r18'
+}
+genres_dict = {
+    k: 'genre/'+v if k != '話題' else v for k, v in genres_dict.items()
+}
+
+terms_dict = {
+    '毎時': 'hour',
+    '24時間': '24h',
+    '週間': 'week',
+    '月間': 'month',
+    '全期間': 'total'
+}
+
+
+def ranking_url(genre: str, term: str, base_url: str = 'https://www.nicovideo.jp'):
+    # genre, term は genres_dict, terms_dict のキー
+    return f'{base_url}/ranking/{genres_dict[genre]}?term={terms_dict[term]}'
 
 
 def fetch_ranking_info(url: str):
-    source = requests.get(url)
+    source = ratelimit.get(url)
     soup = BeautifulSoup(source.text, 'html.parser')
     elems = soup.find_all('div', class_='NC-VideoMediaObject')
 
@@ -27,7 +65,7 @@ def fetch_ranking_info(url: str):
             counter.text for counter in elem.find_all('div', 'NC-VideoMetaCount')
         ]
         info[i] = {
-            'url': f'https://www.nicovideo.jp/watch/{vid}',
+            'url': urljoin(url, f'/watch/{vid}'),
             'title': title.strip(),
             'thumbnail': thumbnail,
             'post': post.strip(),
@@ -41,12 +79,7 @@ def fetch_ranking_info(url: str):
 
 
 def fetch_video_info(url: str):
-    source = requests.get(url)
-    soup = BeautifulSoup(source.text, 'html.parser')
-
-    video_datas = json.loads(
-        soup.select_one('#js-initial-watch-data').get('data-api-data')
-    )['video']
+    video_datas = metacache.get(url)['video']
 
     title = video_datas['title']
     thumbnail = video_datas['thumbnail']['url']
@@ -72,6 +105,6 @@ def fetch_video_info(url: str):
     return info
 
 
-# URL から Image オブジェクトを取得
-def url2img(url: str):
-    return Image.open(BytesIO(requests.get(url).content))
\ No newline at end of file
+# URL から Image オブジェクトを取得 (size を渡すと縮小済みのものを返す)
+def url2img(url: str, size: tuple = None):
+    return thumbcache.get(url, size)
\ No newline at end of file
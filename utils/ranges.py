@@ -0,0 +1,78 @@
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+
+class MissingRanges():
+    def __init__(self):
+        # 取得できていないコメント番号を閉区間 [lo, hi] のリストで持つ
+        self.los = []
+        self.his = []
+        self.max_no = 0
+
+    def __len__(self):
+        return sum([hi-lo+1 for lo, hi in zip(self.los, self.his)])
+
+    def __iter__(self):
+        return zip(self.los, self.his)
+
+    def loaded_num(self):
+        return self.max_no - len(self)
+
+    def contains(self, nos):
+        # 各番号が欠番区間に含まれるかどうか
+        nos = np.asarray(nos, dtype=np.int64)
+        if not self.los:
+            return np.zeros(len(nos), dtype=bool)
+
+        los, his = np.array(self.los), np.array(self.his)
+        k = np.searchsorted(los, nos, side='right') - 1
+        return (k >= 0) & (nos <= his[np.maximum(k, 0)])
+
+    def count(self, lo: int, hi: int):
+        # [lo, hi] に含まれる欠番の数
+        i, j = bisect_left(self.his, lo), bisect_right(self.los, hi)
+        return sum([
+            min(hi, self.his[k]) - max(lo, self.los[k]) + 1 for k in range(i, j)
+        ])
+
+    def update(self, nos):
+        # 取得した番号を欠番区間から取り除く
+        nos = np.unique(np.asarray(nos, dtype=np.int64))
+        if not len(nos):
+            return
+
+        top = int(nos[-1])
+        if top > self.max_no:
+            # これまでの最大番号より後ろは一旦すべて欠番とみなす
+            self.los.append(self.max_no+1)
+            self.his.append(top)
+            self.max_no = top
+
+        i = bisect_left(self.his, int(nos[0]))
+        j = bisect_right(self.los, top)
+
+        new_los, new_his = [], []
+        for lo, hi in zip(self.los[i:j], self.his[i:j]):
+            inner = nos[np.searchsorted(nos, lo):np.searchsorted(nos, hi, side='right')]
+            pts = np.concatenate([[lo-1], inner, [hi+1]])
+            k = np.flatnonzero(np.diff(pts) > 1)
+            new_los.extend((pts[k]+1).tolist())
+            new_his.extend((pts[k+1]-1).tolist())
+
+        self.los[i:j] = new_los
+        self.his[i:j] = new_his
+
+    def plan(self, w: int, min_no: int = 0):
+        # 欠番を下から順に見て，1 リクエストで w 件ずつ埋められるよう
+        # 読み込み直す区間の上端 (アンカー) を決める (min_no 以下は対象外)
+        w = max(int(w), 1)
+        anchors, r = [], min_no
+        for lo, hi in self:
+            l = max(lo, r+1)
+            while l <= hi:
+                r = min(l+w, self.max_no)
+                if r != self.max_no:
+                    anchors.append(r)
+                l = r+1
+
+        return anchors
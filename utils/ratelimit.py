@@ -0,0 +1,239 @@
+import threading
+import requests
+from time import sleep, monotonic
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from urllib.parse import urlparse
+from typing import Callable
+
+from utils import session
+
+
+class RateLimiter():
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: int = 5,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        rate_step: float = 0.5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 60.0,
+        max_wait: float = 1.0,
+    ):
+        # トークンバケット: rate [req/s] で補充，最大 burst 個まで貯められる
+        # rate=None なら待たずに失敗の回数だけを数える (画像・CDN 用)
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+
+        self.tokens = float(burst)
+        self.failures = 0
+        self.backoff_until = 0.0
+        # 待っていた時間 [s] (複数のスレッドが同時に待っていても重ねて数えない)
+        self.stall_time = 0.0
+        self.request_num = 0
+        self._stalling = 0
+        self._stall_start = 0.0
+
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # 使えるトークンがあれば 1 つ取って 0 を，なければ今の rate で
+        # 1 つ貯まるまで (バックオフ中はその終わりまで) の待ち時間を返す
+        # (先に借りておくと rate が戻っても長い待ちが残るので借りない)
+        with self._lock:
+            if self.rate is None:
+                self.request_num += 1
+                return 0.0
+
+            now = monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now-self._last)*self.rate
+            )
+            self._last = now
+
+            if self.backoff_until > now:
+                return self.backoff_until-now
+            if self.tokens < 1:
+                return (1-self.tokens)/self.rate
+
+            self.tokens -= 1
+            self.request_num += 1
+            return 0.0
+
+    def acquire(self):
+        # 待ったあとは rate が変わっているかもしれないので計算し直す
+        # (1 回の待ちは max_wait 秒までにして，速度の回復をすぐ反映する)
+        waited = 0.0
+        wait = self._take()
+        if wait <= 0:
+            return waited
+
+        with self.stalled():
+            while wait > 0:
+                wait = min(wait, self.max_wait)
+                sleep(wait)
+                waited += wait
+                wait = self._take()
+
+        return waited
+
+    def success(self):
+        # 成功したら少しずつ速度を戻す (加算的増加)
+        with self._lock:
+            self.failures = 0
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate+self.rate_step)
+
+    def failure(self):
+        # 空・エラーが返ってきたら速度を半分にして指数的に待つ (乗算的減少)
+        # 並列に送ったリクエストがまとめて失敗しても半分にするのは
+        # 待っている間 (backoff_until まで) に 1 回だけにする
+        with self._lock:
+            self.failures += 1
+            if self.rate is None:
+                return 0.0
+
+            if monotonic() >= self.backoff_until:
+                self.rate = max(self.min_rate, self.rate/2)
+            delay = min(
+                self.backoff_max, self.backoff_base**self.failures
+            )
+            self.backoff_until = max(self.backoff_until, monotonic()+delay)
+
+            return delay
+
+    def backoff_remaining(self):
+        return max(0.0, self.backoff_until-monotonic())
+
+    @contextmanager
+    def stalled(self):
+        # この中で待っている時間を stall_time に足す
+        # いずれかの呼び出し元が待っている区間の和 (壁時計の時間) を数える
+        with self._lock:
+            if not self._stalling:
+                self._stall_start = monotonic()
+            self._stalling += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stalling -= 1
+                if not self._stalling:
+                    self.stall_time += monotonic()-self._stall_start
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class RequestBudget():
+    def __init__(self, limit: int):
+        # 全ホスト・全スレッドで共有するリクエスト数の上限
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.used >= self.limit:
+                raise BudgetExceeded(f'request budget ({self.limit}) exceeded')
+            self.used += 1
+
+    def remaining(self):
+        with self._lock:
+            return self.limit - self.used
+
+
+# 待たせずに失敗だけを数えるホスト (サムネイル画像・CDN)
+unthrottled_hosts = ['*.nimg.jp', '*cdn*']
+
+# ホストごとの RateLimiter (コメント API・視聴ページ・ランキングページ)
+limiters = {}
+# 待たせないリクエスト用に失敗だけを数える RateLimiter
+trackers = {}
+_limiters_lock = threading.Lock()
+budget = None
+
+
+def get_limiter(url: str, throttle: bool = True):
+    # ホストごとに 1 つの RateLimiter を共有する
+    # throttle=False や画像・CDN のホストには待たせないものを返す
+    host = urlparse(url).netloc
+    throttle = throttle and not any([fnmatch(host, p) for p in unthrottled_hosts])
+    with _limiters_lock:
+        if not throttle:
+            if host not in trackers:
+                trackers[host] = RateLimiter(rate=None)
+
+            return trackers[host]
+
+        if host not in limiters:
+            limiters[host] = RateLimiter()
+
+        return limiters[host]
+
+
+def set_limiter(url: str, limiter: RateLimiter):
+    with _limiters_lock:
+        limiters[urlparse(url).netloc] = limiter
+
+
+def set_budget(limit: int = None):
+    # None で上限なしに戻す
+    global budget
+    budget = RequestBudget(limit) if limit is not None else None
+    return budget
+
+
+def stall_report():
+    return {
+        host if limiter.rate is not None else f'{host} (unthrottled)': {
+            'requests': limiter.request_num,
+            'stall_time': limiter.stall_time,
+            'rate': limiter.rate,
+            'failures': limiter.failures,
+        }
+        for host, limiter in [*limiters.items(), *trackers.items()]
+    }
+
+
+def get(
+    url: str, judge: Callable = None, throttle: bool = True, retries: int = 3,
+    **kwargs
+):
+    # judge(res) が False を返したレスポンスも失敗として扱う
+    # throttle=False (サムネイル画像など) は待たずに失敗だけを数える
+    # 429 や 5xx は RateLimiter の待ち時間だけ待って retries 回まで送り直し，
+    # それでもだめなら requests.HTTPError を送出する
+    limiter = get_limiter(url, throttle)
+    for i in range(retries):
+        if budget is not None:
+            budget.take()
+
+        limiter.acquire()
+
+        try:
+            res = session.get(url, **kwargs)
+        except requests.RequestException:
+            limiter.failure()
+            raise
+
+        if res.status_code == 429 or res.status_code >= 500:
+            limiter.failure()
+            if i+1 < retries:
+                continue
+            res.raise_for_status()
+        elif judge is not None and not judge(res):
+            limiter.failure()
+        else:
+            limiter.success()
+
+        return res
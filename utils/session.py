@@ -0,0 +1,67 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.shared import Shared
+
+
+default_config = {
+    # ホストごとに保持するコネクション数
+    'pool_connections': 10,
+    'pool_maxsize': 16,
+    'max_retries': 2,
+    # (接続, 読み込み) のタイムアウト [s]
+    'timeout': (5, 30),
+    'headers': {
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'User-Agent': 'NicoVideoCommentAnalysis',
+    },
+}
+
+
+def make_session(**kwargs):
+    conf = dict(config, **kwargs)
+
+    session = requests.Session()
+    session.headers.update(conf['headers'])
+
+    adapter = HTTPAdapter(
+        pool_connections=conf['pool_connections'],
+        pool_maxsize=conf['pool_maxsize'],
+        max_retries=conf['max_retries'],
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+# 設定 (config) を変えると今の Session を閉じ，次の get_session() で作り直す
+shared = Shared(make_session, default_config, on_discard=lambda s: s.close())
+config = shared.config
+
+
+def get_session():
+    return shared.get()
+
+
+def configure(**kwargs):
+    shared.configure(**kwargs)
+
+
+def set_session(session: requests.Session):
+    # テスト用に偽の transport を mount した Session などを差し込む
+    shared.set(session)
+
+
+def mount(prefix: str, adapter: HTTPAdapter):
+    get_session().mount(prefix, adapter)
+
+
+def get(url: str, **kwargs):
+    kwargs.setdefault('timeout', config['timeout'])
+    return get_session().get(url, **kwargs)
+
+
+def close():
+    shared.reset()
@@ -0,0 +1,42 @@
+import threading
+from typing import Callable
+
+
+class Shared():
+    def __init__(
+        self, factory: Callable, default_config: dict, on_discard: Callable = None
+    ):
+        # factory(**config) で作ったものをプロセス内で 1 つだけ共有する
+        # 設定を変更したら次の get() で作り直す (古いものは on_discard に渡す)
+        self.factory = factory
+        self.default_config = default_config
+        self.config = dict(default_config)
+        self.on_discard = on_discard
+
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._instance is None:
+                self._instance = self.factory(**self.config)
+
+            return self._instance
+
+    def set(self, instance):
+        with self._lock:
+            self._instance = instance
+
+    def configure(self, **kwargs):
+        with self._lock:
+            self.config.update(kwargs)
+            self._discard()
+
+    def reset(self):
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        if self._instance is not None and self.on_discard is not None:
+            self.on_discard(self._instance)
+        self._instance = None
@@ -0,0 +1,126 @@
+import os
+import gzip
+import json
+import zlib
+import pandas as pd
+from abc import ABC, abstractmethod
+from pathlib import Path
+from time import monotonic
+
+from utils.columnar import save_parquet, load_parquet
+
+
+class CommentSink(ABC):
+    def __init__(
+        self, path: str, flush_rows: int = 10000, flush_interval: float = 30.0
+    ):
+        # 取得したバッチを貯めておき，flush_rows 件か flush_interval 秒ごとに
+        # ディスクへ追記する (途中で落ちても書き出し済みの分は残る)
+        self.path = Path(path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.buffer = []
+        self.buffered = 0
+        self.written = 0
+        self.last = monotonic()
+
+    def write(self, comments_df: pd.DataFrame):
+        if comments_df is None or comments_df.empty:
+            return
+
+        self.buffer.append(comments_df)
+        self.buffered += len(comments_df)
+        if self.buffered >= self.flush_rows or \
+                monotonic() - self.last >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            comments_df = pd.concat(self.buffer)
+            self._write(comments_df)
+            self.written += len(comments_df)
+
+        self.buffer, self.buffered = [], 0
+        self.last = monotonic()
+
+    @abstractmethod
+    def _write(self, comments_df: pd.DataFrame):
+        # 貯めたコメントを書き出す (保存形式ごとに実装する)
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JsonLinesSink(CommentSink):
+    # 1 回の書き出しを 1 つの gzip メンバとして追記する
+    # (gzip は複数メンバを連結してもそのまま読める)
+    def _write(self, comments_df: pd.DataFrame):
+        df = comments_df.reset_index()
+        cols = [
+            df[col].astype(object).where(df[col].notna(), None).tolist()
+            for col in df.columns
+        ]
+        lines = [
+            json.dumps(dict(zip(df.columns, row)), ensure_ascii=False)
+            for row in zip(*cols)
+        ]
+        data = gzip.compress(('\n'.join(lines) + '\n').encode(), compresslevel=6)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, mode='ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetSink(CommentSink):
+    # path をディレクトリとし，1 回の書き出しを 1 つの part ファイルにする
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.part = len(list(self.path.glob('part-*.parquet')))
+
+    def _write(self, comments_df: pd.DataFrame):
+        # 書き込み途中のファイルは '.' 始まりにして読み込み対象から外す
+        path = self.path / f'part-{self.part:05d}.parquet'
+        tmp_path = self.path / f'.{path.name}.tmp'
+        save_parquet(comments_df, tmp_path)
+        os.replace(tmp_path, path)
+        self.part += 1
+
+
+def read_jsonl(path: str):
+    # 書き込み途中で落ちた末尾のメンバは読み飛ばす
+    records = []
+    try:
+        with gzip.open(path, mode='rt') as f:
+            for line in f:
+                records.append(json.loads(line))
+    except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError):
+        pass
+
+    if not records:
+        return pd.DataFrame()
+
+    comments_df = pd.DataFrame.from_records(records).set_index(['fork', 'no'])
+    comments_df = comments_df[~comments_df.index.duplicated(keep='first')]
+
+    return comments_df.sort_values('write_time')
+
+
+def read_parts(path: str, **kwargs):
+    # 同じディレクトリに書き足した part 同士で重なったコメントは最初のものを残す
+    comments_df = load_parquet(path, **kwargs)
+    if comments_df.index.names == ['fork', 'no']:
+        comments_df = comments_df[~comments_df.index.duplicated(keep='first')]
+
+    return comments_df.sort_values('write_time') \
+        if 'write_time' in comments_df.columns else comments_df
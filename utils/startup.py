@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+from time import perf_counter
+
+
+# NVCA_PROFILE_STARTUP=1 で起動時間を計測して標準エラーに出す
+# (1 以外の値ならそのパスに JSON でも保存する)
+# NVCA_PROFILE_EXIT=1 なら最初のウィンドウが出たところで終了する (ベンチマーク用)
+flag = os.environ.get('NVCA_PROFILE_STARTUP', '')
+enabled = flag not in ('', '0')
+exit_after = os.environ.get('NVCA_PROFILE_EXIT', '') not in ('', '0')
+
+t0 = perf_counter()
+marks = []
+
+
+class TimedLoader():
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self.timer.stack
+        stack.append(0.0)
+        t = perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            total = perf_counter() - t
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            # (自身と子モジュールを含む時間, 自身だけの時間)
+            self.timer.times[module.__name__] = (total, total - children)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer():
+    # 他の finder が見つけた spec の loader を包んでモジュールごとの import 時間を測る
+    def __init__(self):
+        self.times = {}
+        self.stack = []
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+
+        return None
+
+    def top(self, n: int = 20):
+        # import された順ではなく，子を含む時間の長いトップレベルのモジュール順
+        tops = {k: v for k, v in self.times.items() if '.' not in k}
+        return sorted(tops.items(), key=lambda x: -x[1][0])[:n]
+
+
+timer = ImportTimer()
+if enabled:
+    sys.meta_path.insert(0, timer)
+
+
+def mark(name: str):
+    if enabled:
+        marks.append((name, perf_counter() - t0))
+
+
+def report(file=sys.stderr):
+    if not enabled:
+        return
+
+    print('=== startup ===', file=file)
+    for name, t in marks:
+        print(f'{t*1000:9.1f} ms  {name}', file=file)
+    print('=== imports (cumulative / self) ===', file=file)
+    for name, (total, own) in timer.top():
+        print(f'{total*1000:9.1f} ms {own*1000:9.1f} ms  {name}', file=file)
+
+    if flag != '1':
+        with open(flag, mode='w') as f:
+            json.dump({
+                'marks': dict(marks),
+                'imports': {k: {'total': v[0], 'self': v[1]} for k, v in timer.times.items()},
+            }, f, indent=2)
+
+
+def watch_first_window(win):
+    # 最初にウィンドウが表示された時点を記録する
+    if not enabled:
+        return
+
+    def on_map(event):
+        if event.widget is not win:
+            return
+        win.unbind('<Map>', funcid)
+        mark('first window')
+        report()
+        if exit_after:
+            win.after(0, win.destroy)
+
+    funcid = win.bind('<Map>', on_map, add='+')
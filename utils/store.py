@@ -0,0 +1,79 @@
+import os
+import json
+import datetime
+import pandas as pd
+from pathlib import Path
+
+
+store_dir = 'store'
+
+
+class CommentStore():
+    def __init__(self, root: str = store_dir):
+        # root/{video_id}/{fork}.pkl にコメント，root/{video_id}/marks.json に
+        # fork ごとの到達点 (最大のコメント番号，最新の書き込み時刻など) を保存する
+        # settled_no 以下の欠番は読み込みを試し終えたもの (削除済みなど)
+        self.root = Path(root)
+
+    def video_dir(self, video_id: str):
+        return self.root / video_id
+
+    def forks(self, video_id: str):
+        return sorted([
+            int(path.stem) for path in self.video_dir(video_id).glob('*.pkl')
+        ])
+
+    def load(self, video_id: str, forks: list = None):
+        forks = self.forks(video_id) if forks is None else forks
+        dfs = [
+            pd.read_pickle(self.video_dir(video_id) / f'{fork}.pkl')
+            for fork in forks
+            if (self.video_dir(video_id) / f'{fork}.pkl').exists()
+        ]
+
+        return pd.concat(dfs).sort_values('write_time') if dfs else None
+
+    def marks(self, video_id: str):
+        path = self.video_dir(video_id) / 'marks.json'
+        if not path.exists():
+            return {}
+
+        with open(path) as f:
+            return {int(k): v for k, v in json.load(f).items()}
+
+    def save(
+        self, video_id: str, comments_df: pd.DataFrame, settled: dict = None
+    ):
+        # settled[fork]: 読み込みを試し終えた欠番の上限 (settled_no を進める)
+        if comments_df is None or comments_df.empty:
+            return
+
+        video_dir = self.video_dir(video_id)
+        video_dir.mkdir(parents=True, exist_ok=True)
+
+        marks = self.marks(video_id)
+        fork_values = comments_df.index.get_level_values('fork')
+        for fork in sorted(set(fork_values)):
+            fork_df = comments_df[fork_values == fork]
+            nos = fork_df.index.get_level_values('no')
+
+            # 途中で落ちても壊れたファイルが残らないよう置き換えで書き込む
+            path = video_dir / f'{fork}.pkl'
+            fork_df.to_pickle(f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+
+            settled_no = marks.get(int(fork), {}).get('settled_no', 0)
+            settled_no = max(settled_no, (settled or {}).get(int(fork), 0))
+            marks[int(fork)] = {
+                'max_no': int(nos.max()),
+                'settled_no': min(settled_no, int(nos.max())),
+                'comment_num': len(fork_df),
+                'latest_time': float(fork_df.write_time.max()),
+                'oldest_time': float(fork_df.write_time.min()),
+                'saved_at': datetime.datetime.now().timestamp(),
+            }
+
+        path = video_dir / 'marks.json'
+        with open(f'{path}.tmp', mode='w') as f:
+            json.dump(marks, f, indent=2)
+        os.replace(f'{path}.tmp', path)
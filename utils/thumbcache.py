@@ -0,0 +1,181 @@
+import os
+import sys
+import hashlib
+import threading
+from io import BytesIO
+from pathlib import Path
+from collections import OrderedDict
+from PIL import Image
+
+from utils import ratelimit
+from utils.shared import Shared
+
+
+def user_cache_dir(app: str = 'nvca'):
+    # 起動したディレクトリによらないユーザごとのキャッシュ置き場
+    # (.app は / から起動されるので相対パスには書き込めない)
+    if sys.platform == 'darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    elif os.name == 'nt':
+        base = Path(os.environ.get('LOCALAPPDATA', Path.home()))
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+
+    return base / app
+
+
+default_config = {
+    # メモリ上に保持する画像数
+    'maxsize': 512,
+    # None ならディスクには保存しない
+    'cache_dir': str(user_cache_dir() / 'thumbnails'),
+    # ディスク上の上限 [byte] (超えたら古いものから消す)
+    'max_bytes': 64 * 2**20,
+}
+
+
+class ThumbCache():
+    def __init__(
+        self, maxsize: int = 512, cache_dir: str = None, max_bytes: int = 64 * 2**20
+    ):
+        # (url, size) ごとに縮小済みの画像を LRU (メモリ) とディスクに持つ
+        # ディスクには元画像 (取得したバイト列) と縮小済みの PNG を置く
+        self.maxsize = maxsize
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+
+        self.images = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.downloads = 0
+        self._lock = threading.Lock()
+
+        # ディスクに書き込めなければメモリだけで続ける
+        self.disk_bytes = 0
+        if self.cache_dir:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self.disk_bytes = sum(p.stat().st_size for p in self.cache_dir.iterdir())
+            except OSError:
+                self.cache_dir = None
+
+    def disk_path(self, url: str, size: tuple = None):
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return self.cache_dir / (f'{name}_{size[0]}x{size[1]}.png' if size else f'{name}.orig')
+
+    def remember(self, key: tuple, img: Image.Image):
+        with self._lock:
+            self.images[key] = img
+            self.images.move_to_end(key)
+            while len(self.images) > self.maxsize:
+                self.images.popitem(last=False)
+
+    def read_disk(self, path: Path):
+        if not (self.cache_dir and path.exists()):
+            return None
+
+        # 最終アクセス時刻で古いものから消すので読んだら更新する
+        try:
+            os.utime(path)
+            with open(path, mode='rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_disk(self, path: Path, data: bytes):
+        if not self.cache_dir:
+            return
+
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        try:
+            with open(tmp_path, mode='wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # 書き込めなくても画像はメモリにあるのでそのまま使う
+            return
+
+        with self._lock:
+            self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # 合計が上限の 8 割を下回るまで古いものから消す
+        try:
+            stats = [
+                (p, p.stat()) for p in self.cache_dir.iterdir() if not p.name.startswith('.')
+            ]
+        except OSError:
+            return
+
+        for path, stat in sorted(stats, key=lambda x: x[1].st_mtime):
+            if self.disk_bytes <= self.max_bytes * 0.8:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            self.disk_bytes -= stat.st_size
+
+    def original(self, url: str):
+        data = self.read_disk(self.disk_path(url)) if self.cache_dir else None
+        if data is None:
+            self.downloads += 1
+            # 画像のホストは待たせない (失敗だけを数える)
+            data = ratelimit.get(url, throttle=False).content
+            if self.cache_dir:
+                self.write_disk(self.disk_path(url), data)
+
+        img = Image.open(BytesIO(data))
+        img.load()
+        return img
+
+    def get(self, url: str, size: tuple = None):
+        key = (url, tuple(size) if size else None)
+        with self._lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                self.hits += 1
+                return self.images[key]
+
+        data = self.read_disk(self.disk_path(url, key[1])) \
+            if self.cache_dir and size else None
+        if data is not None:
+            self.disk_hits += 1
+            img = Image.open(BytesIO(data))
+            img.load()
+        else:
+            img = self.original(url)
+            if size:
+                img = img.resize(key[1])
+                if self.cache_dir:
+                    buf = BytesIO()
+                    img.save(buf, format='PNG')
+                    self.write_disk(self.disk_path(url, key[1]), buf.getvalue())
+
+        self.remember(key, img)
+        return img
+
+    def clear(self):
+        with self._lock:
+            self.images.clear()
+
+
+# 設定 (config) を変えると次の get_cache() で作り直す
+shared = Shared(ThumbCache, default_config)
+config = shared.config
+
+
+def get_cache():
+    return shared.get()
+
+
+def configure(**kwargs):
+    shared.configure(**kwargs)
+
+
+def get(url: str, size: tuple = None):
+    return get_cache().get(url, size)
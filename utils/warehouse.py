@@ -0,0 +1,179 @@
+import sqlite3
+import datetime
+import threading
+import pandas as pd
+
+
+warehouse_path = 'warehouse.db'
+
+schema = '''
+CREATE TABLE IF NOT EXISTS videos (
+    video_id    TEXT PRIMARY KEY,
+    url         TEXT,
+    title       TEXT,
+    thumbnail   TEXT,
+    post        TEXT,
+    view        INTEGER,
+    comment     INTEGER,
+    "like"      INTEGER,
+    mylist      INTEGER,
+    owner_id    TEXT,
+    owner_name  TEXT,
+    post_time   REAL,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    video_id    TEXT NOT NULL,
+    fork        INTEGER NOT NULL,
+    thread_id   TEXT,
+    max_no      INTEGER,
+    comment_num INTEGER,
+    latest_time REAL,
+    PRIMARY KEY (video_id, fork)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    video_id    TEXT NOT NULL,
+    fork        INTEGER NOT NULL,
+    no          INTEGER NOT NULL,
+    comment     TEXT,
+    user_id     TEXT,
+    write_time  REAL,
+    video_time  REAL,
+    "184"       INTEGER,
+    position    TEXT,
+    size        TEXT,
+    color       TEXT,
+    command     TEXT,
+    score       INTEGER,
+    PRIMARY KEY (video_id, fork, no)
+);
+CREATE INDEX IF NOT EXISTS comments_user_id ON comments (user_id);
+CREATE INDEX IF NOT EXISTS comments_write_time ON comments (write_time);
+CREATE INDEX IF NOT EXISTS comments_video_time ON comments (video_id, video_time);
+'''
+
+video_columns = [
+    'video_id', 'url', 'title', 'thumbnail', 'post', 'view', 'comment',
+    'like', 'mylist', 'owner_id', 'owner_name', 'post_time', 'updated_at'
+]
+comment_columns = [
+    'comment', 'user_id', 'write_time', 'video_time', '184',
+    'position', 'size', 'color', 'command', 'score'
+]
+
+
+def quote(col: str):
+    return f'"{col}"'
+
+
+class CommentWarehouse():
+    def __init__(self, path: str = warehouse_path):
+        # 複数動画のコメントをまとめて持つ SQLite データベース
+        # (video_id, fork, no) が主キーで，user_id・write_time・video_time に索引を張る
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(schema)
+
+    def close(self):
+        self.conn.close()
+
+    def add_video(self, video_id: str, info: dict):
+        # info は fetch_video_info の戻り値 (足りない項目は NULL)
+        row = dict(info, video_id=video_id)
+        row.setdefault('updated_at', datetime.datetime.now().timestamp())
+        values = [row.get(col) for col in video_columns]
+
+        with self._lock, self.conn:
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO videos ({", ".join(map(quote, video_columns))}) '
+                f'VALUES ({", ".join("?" * len(video_columns))})',
+                values
+            )
+
+    def add_comments(
+        self, video_id: str, comments_df: pd.DataFrame, threads: dict = {}
+    ):
+        # convert_to_df の出力を 1 トランザクションでまとめて挿入する
+        if comments_df is None or comments_df.empty:
+            return 0
+
+        forks = comments_df.index.get_level_values('fork')
+        nos = comments_df.index.get_level_values('no')
+        cols = [
+            comments_df[col].astype(object).where(comments_df[col].notna(), None).tolist()
+            for col in comment_columns
+        ]
+        rows = zip(
+            [video_id] * len(comments_df), forks.tolist(), nos.tolist(), *cols
+        )
+
+        names = ['video_id', 'fork', 'no'] + comment_columns
+        with self._lock, self.conn:
+            cur = self.conn.executemany(
+                f'INSERT OR IGNORE INTO comments ({", ".join(map(quote, names))}) '
+                f'VALUES ({", ".join("?" * len(names))})',
+                rows
+            )
+            inserted = cur.rowcount
+
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO threads '
+                'SELECT video_id, fork, ?, MAX(no), COUNT(*), MAX(write_time) '
+                'FROM comments WHERE video_id = ? AND fork = ? GROUP BY video_id, fork',
+                [
+                    (threads.get(fork, {}).get('id'), video_id, fork)
+                    for fork in sorted(set(forks.tolist()))
+                ]
+            )
+
+        return inserted
+
+    def add_info(self, ninfo):
+        # NicovideoInfomation をそのまま取り込む
+        counter = ninfo.video_counter
+        self.add_video(ninfo.video_id, {
+            'url': ninfo.video_url,
+            'title': ninfo.video_title,
+            'post': datetime.datetime.fromtimestamp(
+                ninfo.post_time).strftime('%Y/%-m/%-d %H:%M'),
+            'view': counter.get('view'),
+            'comment': counter.get('comment'),
+            'like': counter.get('like'),
+            'mylist': counter.get('mylist'),
+            'owner_id': getattr(ninfo, 'owner_id', None),
+            'owner_name': getattr(ninfo, 'owner_name', None),
+            'post_time': ninfo.post_time,
+        })
+
+        return self.add_comments(ninfo.video_id, ninfo.comments_df, ninfo.threads)
+
+    def query(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def videos(self):
+        return self.query('SELECT * FROM videos ORDER BY post_time')
+
+    def load_comments(self, video_id: str, forks: list = None):
+        # 動画のコメントを convert_to_df と同じ形 ((fork, no) の索引) で取り出す
+        sql = 'SELECT * FROM comments WHERE video_id = ?'
+        params = [video_id]
+        if forks is not None:
+            sql += f' AND fork IN ({", ".join("?" * len(forks))})'
+            params += list(forks)
+
+        comments_df = self.query(sql + ' ORDER BY write_time', tuple(params))
+        return comments_df.drop(columns='video_id').set_index(['fork', 'no'])
+
+    def user_comments(self, user_id: str):
+        # 動画をまたいで同じユーザのコメントを探す
+        return self.query(
+            'SELECT c.*, v.title FROM comments c '
+            'LEFT JOIN videos v USING (video_id) '
+            'WHERE c.user_id = ? ORDER BY c.write_time',
+            (user_id,)
+        )